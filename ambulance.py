@@ -1,11 +1,28 @@
 
 from flask import Flask, request, jsonify
 import requests
+import urllib3
 import os
 import re
+import hashlib
+import time
+import uuid
 import logging
+import math
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from flask_cors import CORS
 from dotenv import load_dotenv
+from http_client import get_http_client
+from cache import LRUCache, get_place_cache
+from provider_index import ProviderIndex
+from call_dispatch import CallDispatcher, CallFailedError, CallOutcomeUnknown, RetryableCallError
+from streaming import requested_stream_format, stream_records
+from singleflight import SingleFlight
+from quota import EMERGENCY, get_quota_scheduler
+import deadline as request_deadline
 
 load_dotenv(".env.local")
 app = Flask(__name__)
@@ -15,6 +32,47 @@ logger = logging.getLogger(__name__)
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 BLAND_AI_API_KEY    = os.getenv("BLAND_AI_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+BLAND_API_URL        = os.getenv("BLAND_API_URL", "https://api.bland.ai/v1")
+BLAND_CLOCK_SKEW     = float(os.getenv("BLAND_CLOCK_SKEW", "30"))
+
+# Place details lookups fan out over a bounded pool; whatever has not resolved
+# by the deadline is dropped so an emergency search never waits on the slowest call.
+DETAILS_MAX_WORKERS      = int(os.getenv("AMBULANCE_DETAILS_WORKERS", "8"))
+DETAILS_DEADLINE_SECONDS = float(os.getenv("AMBULANCE_DETAILS_DEADLINE", "4"))
+details_executor = ThreadPoolExecutor(max_workers=DETAILS_MAX_WORKERS, thread_name_prefix="place-details")
+DETAILS_FIELDS   = ("name", "formatted_phone_number", "opening_hours")
+# Every Google call made while serving a search shares one latency budget, and
+# slow details/search calls are hedged with a duplicate request after the p95.
+SEARCH_LATENCY_BUDGET = float(os.getenv("AMBULANCE_LATENCY_BUDGET", "6"))
+CALL_LATENCY_BUDGET   = float(os.getenv("CALL_LATENCY_BUDGET", "10"))
+HEDGE_GOOGLE_CALLS    = os.getenv("AMBULANCE_HEDGE", "1") not in ("0", "false", "no")
+place_cache      = get_place_cache()
+http_client      = get_http_client()
+search_flight    = SingleFlight()
+
+# Providers seen in past searches are indexed locally; lat/lng searches in a
+# covered grid cell are answered from the index in Google's ranking, and Google
+# is only asked again (in the background) once the cell is older than
+# PROVIDER_CELL_TTL, or PROVIDER_OPEN_NOW_TTL for the providers' open_now.
+SEARCH_RADIUS_M  = 10000
+MAX_SERVICES     = 40
+provider_index   = ProviderIndex(
+    cell_deg=float(os.getenv("PROVIDER_CELL_DEG", "0.02")),
+    cell_ttl=float(os.getenv("PROVIDER_CELL_TTL", "3600")),
+    open_now_ttl=float(os.getenv("PROVIDER_OPEN_NOW_TTL", str(15 * 60))),
+    db_path=os.getenv("PROVIDER_INDEX_DB") or None,
+)
+refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cell-refresh")
+refreshing_cells = set()
+refreshing_lock  = threading.Lock()
+
+# Reverse-geocoded addresses are cached per ~50 m cell. /nearby-ambulance-services
+# prewarms the cell so /call-ambulance rarely waits on the Geocode API.
+GEOCODE_CELL_M   = float(os.getenv("GEOCODE_CELL_METERS", "50"))
+geocode_cache    = LRUCache(max_entries=int(os.getenv("GEOCODE_CACHE_SIZE", "4096")),
+                            ttl=float(os.getenv("GEOCODE_CACHE_TTL", "86400")))
+geocode_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="geocode-prewarm")
 
 def normalize_phone_number(number):
     digits = re.sub(r'\D', '', number or '')
@@ -24,82 +82,418 @@ def normalize_phone_number(number):
         digits = digits[1:]
     return f'+91{digits}'
 
+def fetch_place_details(pid):
+    details_url = (
+        f'{GOOGLE_MAPS_BASE_URL}/place/details/json'
+        f'?place_id={pid}'
+        f'&fields={",".join(DETAILS_FIELDS)}'
+        f'&key={GOOGLE_MAPS_API_KEY}'
+    )
+    logger.debug(f"Place details request URL: {details_url}")
+    dresp   = http_client.get(details_url, deadline=DETAILS_DEADLINE_SECONDS, priority=EMERGENCY,
+                              hedge=HEDGE_GOOGLE_CALLS)
+    detail  = dresp.json()
+    dstatus = detail.get("status")
+    logger.debug(f"Place details response status={dstatus} details={detail}")
+    if dstatus != "OK":
+        return None
+    return detail.get("result", {})
+
+def fetch_service_details(pid):
+    r = place_cache.get_or_fetch(pid, DETAILS_FIELDS, lambda: fetch_place_details(pid))
+    if r is None:
+        return None
+
+    phone = r.get("formatted_phone_number")
+    if not phone:
+        return None
+
+    return {
+        'place_id':     pid,
+        'name':         r.get("name"),
+        'open_now':     r.get("opening_hours", {}).get("open_now", False),
+        'phone_number': normalize_phone_number(phone),
+        'opening_hours': r.get("opening_hours")
+    }
+
+def iter_service_details(place_ids, deadline=None, unresolved=None):
+    """Yield (rank, service) as details lookups complete, stopping at the deadline.
+
+    Place ids whose lookup failed or missed the deadline are appended to `unresolved`.
+    """
+    deadline = DETAILS_DEADLINE_SECONDS if deadline is None else deadline
+    budget   = request_deadline.remaining()
+    if budget is not None:
+        deadline = min(deadline, budget)
+    futures  = {request_deadline.submit(details_executor, fetch_service_details, pid): rank
+                for rank, pid in enumerate(place_ids)}
+    try:
+        for f in as_completed(futures, timeout=deadline):
+            try:
+                service = f.result()
+            except Exception:
+                logger.exception("Place details lookup failed")
+                if unresolved is not None:
+                    unresolved.append(place_ids[futures[f]])
+                continue
+            if service:
+                yield futures[f], service
+    except FuturesTimeoutError:
+        pending = [f for f in futures if not f.done()]
+        for f in pending:
+            f.cancel()
+            if unresolved is not None:
+                unresolved.append(place_ids[futures[f]])
+        logger.warning(f"Place details deadline hit: {len(pending)}/{len(futures)} lookups unresolved after {deadline}s")
+
+def resolve_service_details(place_ids, deadline=None, unresolved=None):
+    """Fetch details for place_ids concurrently, keeping ranking order and dropping stragglers."""
+    resolved = sorted(iter_service_details(place_ids, deadline, unresolved), key=lambda item: item[0])
+    return [service for _, service in resolved]
+
+def nearby_search_url(lat, lng):
+    return (
+        f'{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json'
+        f'?location={lat},{lng}'
+        f'&radius={SEARCH_RADIUS_M}'
+        f'&keyword=ambulance'
+        f'&key={GOOGLE_MAPS_API_KEY}'
+    )
+
+def search_ambulance_places(url):
+    """Run a Places search; returns (places by id in ranking order, raw response)."""
+    logger.debug(f"Google Places request URL: {url}")
+    # Identical concurrent searches share one upstream call
+    places = search_flight.do(url, lambda: http_client.get(url, priority=EMERGENCY, hedge=HEDGE_GOOGLE_CALLS).json())
+    status = places.get("status")
+    logger.debug(f"Google Places response status={status} details={places}")
+    if status != "OK":
+        return None, places
+    results = places.get("results", [])[:MAX_SERVICES]
+    return {p["place_id"]: p for p in results if p.get("place_id")}, places
+
+def index_service(place, service):
+    loc = place.get("geometry", {}).get("location")
+    if loc:
+        provider_index.upsert(service['place_id'], loc['lat'], loc['lng'], service['name'],
+                              service['phone_number'], service['open_now'], service['opening_hours'])
+
+def mark_cell_covered(lat, lng, services, unresolved):
+    """Record the search as the cell's coverage, but only if every provider in it resolved."""
+    if unresolved:
+        logger.warning(f"Not marking cell {provider_index.cell_of(lat, lng)} covered: "
+                       f"{len(unresolved)} providers unresolved")
+        return
+    provider_index.mark_refreshed(lat, lng, [service['place_id'] for service in services])
+
+def refresh_provider_cell(lat, lng):
+    cell = provider_index.cell_of(lat, lng)
+    try:
+        by_id, places = search_ambulance_places(nearby_search_url(lat, lng))
+        if by_id is not None:
+            unresolved = []
+            services = resolve_service_details(list(by_id), unresolved=unresolved)
+            for service in services:
+                index_service(by_id[service['place_id']], service)
+            mark_cell_covered(lat, lng, services, unresolved)
+            logger.debug(f"Refreshed provider cell {cell}")
+        elif places.get("status") == "ZERO_RESULTS":
+            provider_index.mark_refreshed(lat, lng)
+        else:
+            logger.error(f"Provider cell refresh failed for {cell}: {places.get('status')}")
+    except Exception:
+        logger.exception(f"Provider cell refresh failed for {cell}")
+    finally:
+        with refreshing_lock:
+            refreshing_cells.discard(cell)
+
+def schedule_cell_refresh(lat, lng):
+    cell = provider_index.cell_of(lat, lng)
+    with refreshing_lock:
+        if cell in refreshing_cells:
+            return
+        refreshing_cells.add(cell)
+    refresh_executor.submit(refresh_provider_cell, lat, lng)
+
+def public_service(service):
+    return {
+        'name':         service['name'],
+        'open_now':     service['open_now'],
+        'phone_number': service['phone_number']
+    }
+
+def stream_indexed_services(records, coverage):
+    for rank, record in enumerate(records):
+        yield {'type': 'service', 'rank': rank, 'service': public_service(record)}
+    yield {'type': 'summary', 'total': len(records), 'source': f'index:{coverage}'}
+
+def stream_searched_services(by_id, lat, lng, text):
+    """Emit each service as soon as its details resolve, then a summary record."""
+    resolved = []
+    unresolved = []
+    for rank, service in iter_service_details(list(by_id), unresolved=unresolved):
+        index_service(by_id[service['place_id']], service)
+        resolved.append((rank, service))
+        yield {'type': 'service', 'rank': rank, 'service': public_service(service)}
+    found = len(resolved)
+    if not text:
+        mark_cell_covered(lat, lng, [service for _, service in sorted(resolved, key=lambda item: item[0])],
+                          unresolved)
+    logger.debug(f"Streamed {found} services")
+    yield {'type': 'summary', 'total': found, 'candidates': len(by_id), 'source': 'google'}
+
+def geocode_key(lat, lng):
+    step_lat = GEOCODE_CELL_M / 111320.0
+    qlat     = round(float(lat) / step_lat)
+    step_lng = step_lat / max(math.cos(math.radians(qlat * step_lat)), 1e-6)
+    return (qlat, round(float(lng) / step_lng))
+
+def fetch_address(lat, lng):
+    geo_url = (
+        f"{GOOGLE_MAPS_BASE_URL}/geocode/json"
+        f"?latlng={lat},{lng}"
+        f"&key={GOOGLE_MAPS_API_KEY}"
+    )
+    logger.debug(f"Geocode request URL: {geo_url}")
+    gresp   = http_client.get(geo_url, priority=EMERGENCY).json()
+    gstatus = gresp.get("status")
+    logger.debug(f"Geocode response status={gstatus} details={gresp}")
+    if gstatus == "OK" and gresp.get("results"):
+        return gresp["results"][0].get("formatted_address")
+    return None
+
+def reverse_geocode(lat, lng):
+    """Formatted address for lat/lng, served from the quantized cache when possible."""
+    key     = geocode_key(lat, lng)
+    address = geocode_cache.get(key)
+    if address is None:
+        address = fetch_address(lat, lng)
+        if address:
+            geocode_cache.set(key, address)
+    return address
+
+def prewarm_geocode(lat, lng):
+    if geocode_cache.peek(geocode_key(lat, lng)) is None:
+        geocode_executor.submit(reverse_geocode, lat, lng)
+
+def parse_coordinates(lat, lng):
+    """(lat, lng) as floats, or (None, None) unless both are finite, in-range numbers."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None, None
+    if not (math.isfinite(lat) and math.isfinite(lng) and -90 <= lat <= 90 and -180 <= lng <= 180):
+        return None, None
+    return lat, lng
+
 @app.route('/')
 def home():
     return "Welcome to the ambulance API."
 
 @app.route('/nearby-ambulance-services', methods=['POST'])
+@request_deadline.with_latency_budget(SEARCH_LATENCY_BUDGET)
 def get_nearby_ambulance_services():
     data = request.get_json() or {}
     lat   = data.get('lat')
     lng   = data.get('lng')
     text  = data.get('text')
+    fmt   = requested_stream_format(data, request)
     print(lng, lat)
     logger.debug(f"Input received → lat={lat} lng={lng} text={text}")
     if text:
         url = (
-            f'https://maps.googleapis.com/maps/api/place/textsearch/json'
+            f'{GOOGLE_MAPS_BASE_URL}/place/textsearch/json'
             f'?query=ambulance+services+in+{text}'
             f'&key={GOOGLE_MAPS_API_KEY}'
         )
     elif lat is not None and lng is not None:
-        url = (
-            f'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
-            f'?location={lat},{lng}'
-            f'&radius=10000'
-            f'&keyword=ambulance'
-            f'&key={GOOGLE_MAPS_API_KEY}'
-        )
+        lat, lng = parse_coordinates(lat, lng)
+        if lat is None:
+            logger.error("Invalid input: lat/lng must be numeric")
+            return jsonify({'error': 'Invalid input: lat/lng must be numeric coordinates'}), 400
+        prewarm_geocode(lat, lng)
+        coverage = provider_index.coverage(lat, lng)
+        if coverage != 'missing':
+            records  = provider_index.query(lat, lng, SEARCH_RADIUS_M, MAX_SERVICES)
+            # open_now older than PROVIDER_OPEN_NOW_TTL is served as None, so refresh the cell for it too.
+            if coverage == 'stale' or provider_index.coverage(lat, lng, ttl=provider_index.open_now_ttl) == 'stale':
+                schedule_cell_refresh(lat, lng)
+            logger.debug(f"Served {len(records)} services from provider index ({coverage})")
+            if fmt:
+                return stream_records(stream_indexed_services(records, coverage), fmt)
+            services = [public_service(r) for r in records]
+            return jsonify({'ambulance_services': services}), 200
+        url = nearby_search_url(lat, lng)
     else:
         logger.error("Invalid input: provide lat/lng or text")
         return jsonify({'error': 'Invalid input: provide lat/lng or text'}), 400
 
-    logger.debug(f"Google Places request URL: {url}")
-    resp   = requests.get(url)
-    places = resp.json()
+    by_id, places = search_ambulance_places(url)
     status = places.get("status")
-    logger.debug(f"Google Places response status={status} details={places}")
     if status == "ZERO_RESULTS":
+        if not text:
+            provider_index.mark_refreshed(lat, lng)
+        if fmt:
+            return stream_records([{'type': 'summary', 'total': 0, 'candidates': 0, 'source': 'google'}], fmt)
         return jsonify({'ambulance_services': []}), 200
-    if status != "OK":
+    if by_id is None:
         logger.error(f"Google Places API error: {status}")
         return jsonify({'error': f'Google API error: {status}', 'details': places}), 500
 
-    services = []
-    for place in places.get("results", [])[:40]:
-        pid = place.get("place_id")
-        if not pid:
-            continue
+    if fmt:
+        return stream_records(stream_searched_services(by_id, lat, lng, text), fmt)
 
-        details_url = (
-            f'https://maps.googleapis.com/maps/api/place/details/json'
-            f'?place_id={pid}'
-            f'&fields=name,formatted_phone_number,opening_hours'
-            f'&key={GOOGLE_MAPS_API_KEY}'
-        )
-        logger.debug(f"Place details request URL: {details_url}")
-        dresp   = requests.get(details_url)
-        detail  = dresp.json()
-        dstatus = detail.get("status")
-        logger.debug(f"Place details response status={dstatus} details={detail}")
-        if dstatus != "OK":
-            continue
+    unresolved = []
+    services = resolve_service_details(list(by_id), unresolved=unresolved)
+    for service in services:
+        index_service(by_id[service['place_id']], service)
+    if not text:
+        mark_cell_covered(lat, lng, services, unresolved)
+
+    logger.debug(f"Found {len(services)} services")
+    return jsonify({'ambulance_services': [public_service(s) for s in services]}), 200
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'place_cache':    place_cache.stats(),
+        'provider_index': provider_index.stats(),
+        'geocode_cache':  geocode_cache.stats(),
+        'call_dispatch':  call_dispatcher.stats(),
+        'http':           http_client.stats(),
+        'search_singleflight': search_flight.stats(),
+        'quota':          get_quota_scheduler().stats()
+    }), 200
 
-        r     = detail.get("result", {})
-        phone = r.get("formatted_phone_number")
-        if not phone:
+def build_call_task(name, call_number, location_str):
+    return (
+        f"You're Kartik, a health assistant at AetherCare. You're calling the ambulance service “{name}” "
+        f"at {call_number} to ask if an ambulance can be arranged for {location_str} as soon as possible. "
+        "Ask them if they can arrange the ambulance. There is a person in need of urgent care. "
+        "If they cannot arrange, thank them for their time and end the call.\n\n"
+        "If there is a long pause, please repeat what you said.\n"
+        "Here’s an example dialogue:\n"
+        "Person: Hello?\n"
+        "You: Hey, this is Kartik from AetherCare. Could you let me know if there is an ambulance available "
+        f"which could reach {location_str} asap? There is a person in need of urgent care\n"
+        "Person: Yes absolutely!\n"
+        "You: That is great! How long would it take to reach here? Also could you let me know the name of the driver?\n"
+        "Person: It would take about 10 mins. The name of the driver isn't available at the moment. I will let you know shortly.\n"
+        "Person: I just realised, we won't be able to send an ambulance. We are sorry.\n"
+        "You: Okay. Thank you for your time.\n"
+        "Person: Ok, thank you!\n"
+        "You: Of course, have a great day! Goodbye."
+    )
+
+def resolve_call_location(lat, lng):
+    """Address to read out on the call; a geocode problem never stops the call being placed."""
+    location_str = "your current location"
+    lat, lng = parse_coordinates(lat, lng)
+    if lat is None:
+        return location_str
+    try:
+        location_str = reverse_geocode(lat, lng) or location_str
+    except Exception:
+        logger.exception("Reverse geocoding failed; calling with the generic location")
+    logger.debug(f"Resolved location: {location_str}")
+    return location_str
+
+def post_bland_call(call_number, task, call_ref=None):
+    headers = {
+        "Content-Type":  "application/json",
+        "authorization":  BLAND_AI_API_KEY
+    }
+    body = {
+        "phone_number": call_number,
+        "task":         task
+    }
+    if call_ref:
+        # Lets find_bland_call recognise this job's call when the POST outcome is unknown.
+        body["metadata"] = {"call_ref": call_ref}
+    # Cutting the POST off after Bland accepted it would leave the call's outcome
+    # unknown, so it keeps its own timeouts rather than the request's budget.
+    with request_deadline.no_budget():
+        return http_client.post(f"{BLAND_API_URL}/calls", headers=headers, json=body)
+
+def request_never_sent(e):
+    """True only for failures before the connection was made, when Bland cannot have seen the request."""
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.exceptions.ConnectionError) or isinstance(e, requests.exceptions.SSLError):
+        return False
+    reason = e.args[0] if e.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+def bland_call_time(call):
+    try:
+        return datetime.fromisoformat(str(call.get("created_at")).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+def find_bland_call(payload, since):
+    """Bland's call for this job if one was placed since `since`, else None; raises if Bland can't be asked."""
+    r = http_client.get(f"{BLAND_API_URL}/calls", headers={"authorization": BLAND_AI_API_KEY},
+                        params={"to_number": payload['call_number'], "limit": 50})
+    if r.status_code != 200:
+        raise RuntimeError(f"Bland AI call lookup failed with {r.status_code}")
+    for call in r.json().get("calls") or []:
+        metadata = call.get("metadata") or {}
+        if metadata:
+            if metadata.get("call_ref") == payload['call_ref']:
+                return call
             continue
+        # Without metadata, any call to this number since the job started counts.
+        created = bland_call_time(call)
+        if created is None or created >= since - BLAND_CLOCK_SKEW:
+            return call
+    return None
 
-        services.append({
-            'name':         r.get("name"),
-            'open_now':     r.get("opening_hours", {}).get("open_now", False),
-            'phone_number': normalize_phone_number(phone)
-        })
+def place_bland_call(call_number, task, call_ref):
+    """Bland's response for a placed call; raises RetryableCallError, CallOutcomeUnknown or CallFailedError."""
+    try:
+        r = post_bland_call(call_number, task, call_ref)
+    except requests.exceptions.RequestException as e:
+        if request_never_sent(e):
+            raise RetryableCallError(f"Bland AI connection failed: {e}")
+        # The connection was up, so Bland may have received the body and placed the call.
+        raise CallOutcomeUnknown(f"Bland AI request error: {e}")
+    try:
+        jr = r.json()
+    except ValueError:
+        jr = {'raw': r.text}
+    logger.debug(f"Bland AI response: {jr}")
+    if r.status_code in (200, 201):
+        return jr
+    if r.status_code == 429:
+        raise RetryableCallError("Bland AI rate limited the call (429)")
+    if r.status_code >= 500:
+        # A 5xx can come back after the call was already placed.
+        raise CallOutcomeUnknown(f"Bland AI API error {r.status_code}")
+    raise CallFailedError('Bland AI API error', details=jr, status_code=r.status_code)
 
-    logger.debug(f"Found {len(services)} services")
-    return jsonify({'ambulance_services': services}), 200
+def dispatch_ambulance_call(payload, report):
+    """Worker body for queued calls: geocode, then place the Bland AI call."""
+    report('geocoding')
+    location_str = resolve_call_location(payload['lat'], payload['lng'])
+    task = build_call_task(payload['name'], payload['call_number'], location_str)
+    report('calling')
+    return place_bland_call(payload['call_number'], task, payload['call_ref'])
+
+call_dispatcher = CallDispatcher(
+    dispatch_ambulance_call,
+    find_call=find_bland_call,
+    max_workers=int(os.getenv("CALL_DISPATCH_WORKERS", "4")),
+    max_attempts=int(os.getenv("CALL_DISPATCH_ATTEMPTS", "3")),
+    backoff=float(os.getenv("CALL_DISPATCH_BACKOFF", "1.0")),
+    idempotency_ttl=float(os.getenv("CALL_IDEMPOTENCY_TTL", "300")),
+)
+# Keys derived from the request body only absorb double-clicks: they match
+# an in-flight job, or one created within CALL_DOUBLE_CLICK_WINDOW seconds.
+CALL_DOUBLE_CLICK_WINDOW = float(os.getenv("CALL_DOUBLE_CLICK_WINDOW", "5"))
 
 @app.route('/call-ambulance', methods=['POST'])
+@request_deadline.with_latency_budget(CALL_LATENCY_BUDGET)
 def call_ambulance():
     data     = request.get_json() or {}
     name     = data.get("name")
@@ -108,7 +502,8 @@ def call_ambulance():
     confirm  = data.get("confirm", False)
     lat      = data.get("lat")
     lng      = data.get("lng")
-    logger.debug(f"Call request received → name={name} orig={orig} override={override} confirm={confirm} lat={lat} lng={lng}")
+    dispatch = data.get("async", False)
+    logger.debug(f"Call request received → name={name} orig={orig} override={override} confirm={confirm} lat={lat} lng={lng} async={dispatch}")
 
     if not orig:
         logger.error("No phone number provided")
@@ -125,65 +520,64 @@ def call_ambulance():
     call_number = normalize_phone_number(override) if override else normalized_orig
     logger.debug(f"Calling number: {call_number}")
 
-    location_str = "your current location"
-    if lat is not None and lng is not None:
-        geo_url = (
-            f"https://maps.googleapis.com/maps/api/geocode/json"
-            f"?latlng={lat},{lng}"
-            f"&key={GOOGLE_MAPS_API_KEY}"
-        )
-        logger.debug(f"Geocode request URL: {geo_url}")
-        gresp   = requests.get(geo_url).json()
-        gstatus = gresp.get("status")
-        logger.debug(f"Geocode response status={gstatus} details={gresp}")
-        if gstatus == "OK" and gresp.get("results"):
-            location_str = gresp["results"][0].get("formatted_address", location_str)
-        logger.debug(f"Resolved location: {location_str}")
-
-    task = (
-        f"You're Kartik, a health assistant at AetherCare. You're calling the ambulance service “{name}” "
-        f"at {call_number} to ask if an ambulance can be arranged for {location_str} as soon as possible. "
-        "Ask them if they can arrange the ambulance. There is a person in need of urgent care. "
-        "If they cannot arrange, thank them for their time and end the call.\n\n"
-        "If there is a long pause, please repeat what you said.\n"
-        "Here’s an example dialogue:\n"
-        "Person: Hello?\n"
-        "You: Hey, this is Kartik from AetherCare. Could you let me know if there is an ambulance available "
-        f"which could reach {location_str} asap? There is a person in need of urgent care\n"
-        "Person: Yes absolutely!\n"
-        "You: That is great! How long would it take to reach here? Also could you let me know the name of the driver?\n"
-        "Person: It would take about 10 mins. The name of the driver isn't available at the moment. I will let you know shortly.\n"
-        "Person: I just realised, we won't be able to send an ambulance. We are sorry.\n"
-        "You: Okay. Thank you for your time.\n"
-        "Person: Ok, thank you!\n"
-        "You: Of course, have a great day! Goodbye."
-    )
+    if dispatch:
+        # Double-clicks send the same body, so the derived key collapses them into one job.
+        key = request.headers.get("Idempotency-Key") or data.get("idempotency_key")
+        ttl = None
+        if not key:
+            key = hashlib.sha256(f"{call_number}|{name}|{lat}|{lng}".encode()).hexdigest()
+            ttl = CALL_DOUBLE_CLICK_WINDOW
+        # call_ref is unique per job, so a later call under the same key is never mistaken for this one
+        payload = {'name': name, 'call_number': call_number, 'lat': lat, 'lng': lng, 'call_ref': uuid.uuid4().hex}
+        job, created = call_dispatcher.submit(payload, key, ttl=ttl)
+        logger.debug(f"Call job {job['job_id']} {'queued' if created else 'deduplicated'}")
+        return jsonify({
+            'message':    'Call queued' if created else 'Call already queued',
+            'job_id':     job['job_id'],
+            'status':     job['status'],
+            'status_url': f"/call-status/{job['job_id']}"
+        }), 202 if created else 200
+
+    location_str = resolve_call_location(lat, lng)
+    task = build_call_task(name, call_number, location_str)
     logger.debug(f"Task prepared: {task}")
 
+    call_ref = uuid.uuid4().hex
+    started  = time.time()
     try:
-        headers = {
-            "Content-Type":  "application/json",
-            "authorization":  BLAND_AI_API_KEY
-        }
-        body = {
-            "phone_number": call_number,
-            "task":         task
-        }
-        r  = requests.post("https://api.bland.ai/v1/calls", headers=headers, json=body)
-        jr = r.json()
-        logger.debug(f"Bland AI response: {jr}")
-        if r.status_code not in (200, 201):
-            logger.error(f"Bland AI API error: {jr}")
-            return jsonify({'error': 'Bland AI API error', 'details': jr}), r.status_code
+        jr = place_bland_call(call_number, task, call_ref)
+    except RetryableCallError as e:
+        logger.error(f"Bland AI call not placed: {e}")
+        return jsonify({'error': 'The call was not placed, please try again', 'details': str(e)}), 503
+    except CallOutcomeUnknown as e:
+        # Like the async path: look for the call before saying anything a user would retry on.
+        logger.error(f"Bland AI call outcome unknown: {e}")
+        try:
+            jr = find_bland_call({'call_number': call_number, 'call_ref': call_ref}, started)
+        except Exception:
+            logger.exception("Bland AI call lookup failed")
+            jr = None
+        if jr is None:
+            return jsonify({
+                'status':  'unknown',
+                'message': 'The call may have been placed. Please wait for it before calling again.',
+                'details': str(e)
+            }), 202
+    except CallFailedError as e:
+        logger.error(f"Bland AI API error: {e.details}")
+        return jsonify({'error': 'Bland AI API error', 'details': e.details}), e.status_code
 
-        return jsonify({
-            'message':      'Call initiated',
-            'call_details': jr
-        }), 200
+    return jsonify({
+        'message':      'Call initiated',
+        'call_details': jr
+    }), 200
 
-    except Exception as e:
-        logger.exception("Exception during Bland AI call")
-        return jsonify({'error': 'Exception occurred', 'details': str(e)}), 500
+@app.route('/call-status/<job_id>', methods=['GET'])
+def call_status(job_id):
+    job = call_dispatcher.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id'}), 404
+    return jsonify(job), 200
 
 if __name__ == '__main__':
     app.run(debug=True, port=3002)
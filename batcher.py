@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Collect single-item inference calls into batched forward passes.
+
+    `predict` is called with an array stacked along a new first axis and must
+    return one row of output per input row. A worker thread takes the first
+    queued item, then keeps collecting until `max_batch_size` items are in
+    hand or `max_wait` seconds have passed since that first item arrived, and
+    runs one `predict` over the lot. Each caller gets its own row back; if the
+    batch fails or returns the wrong number of rows, every caller in it sees
+    the exception.
+    """
+
+    def __init__(self, predict, max_batch_size=16, max_wait=0.005, name="micro-batcher"):
+        self.predict_batch = predict
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self._sizes = deque(maxlen=1024)
+        self._waits = deque(maxlen=1024)
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue one input; returns a Future resolving to its row of the batch output."""
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def predict(self, item, timeout=None):
+        """Blocking single-item predict routed through the batch queue."""
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        flush_at = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = flush_at - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.monotonic()
+            try:
+                outputs = self.predict_batch(np.stack([item for item, _, _ in batch]))
+                if len(outputs) != len(batch):
+                    raise ValueError(f"predict returned {len(outputs)} rows for a batch of {len(batch)}")
+            except Exception as e:
+                logger.exception(f"Batched predict failed for {len(batch)} items")
+                with self._lock:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self._sizes.append(len(batch))
+                self._waits.extend(started - queued_at for _, _, queued_at in batch)
+            for row, (_, future, _) in zip(outputs, batch):
+                future.set_result(row)
+
+    def stats(self):
+        with self._lock:
+            sizes = list(self._sizes)
+            waits = sorted(self._waits)
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': round(self.max_wait * 1000, 1),
+                'queued': self._queue.qsize(),
+                'batches': self.batches,
+                'items': self.items,
+                'errors': self.errors,
+                'avg_batch_size': round(sum(sizes) / len(sizes), 2) if sizes else None,
+                'queue_wait_p50_ms': round(waits[len(waits) // 2] * 1000, 2) if waits else None,
+                'queue_wait_p95_ms': round(waits[min(int(0.95 * len(waits)), len(waits) - 1)] * 1000, 2) if waits else None,
+            }
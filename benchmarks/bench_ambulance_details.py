@@ -0,0 +1,52 @@
+"""Benchmark /nearby-ambulance-services details fan-out against a local stub Places server.
+
+    python benchmarks/bench_ambulance_details.py [--runs 3] [--workers 1 4 8 16]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stub_places import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--results", type=int, default=40)
+    parser.add_argument("--deadline", type=float, default=30.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=(0.2, 0.4), page_size=args.results, pages=1)
+    os.environ["GOOGLE_MAPS_BASE_URL"] = base_url
+    # The search latency budget would otherwise cut the slow baselines off early
+    os.environ["AMBULANCE_LATENCY_BUDGET"] = str(args.deadline)
+    import ambulance
+    logging.getLogger().setLevel(logging.WARNING)
+    client = ambulance.app.test_client()
+
+    print(f"{'workers':>8} {'p50 (s)':>9} {'max (s)':>9} {'services':>9}")
+    for workers in args.workers:
+        ambulance.details_executor = ThreadPoolExecutor(max_workers=workers)
+        ambulance.DETAILS_DEADLINE_SECONDS = args.deadline
+        timings, found = [], 0
+        for _ in range(args.runs):
+            # Measure the cold path: no cached details, no provider index.
+            ambulance.place_cache.memory.clear()
+            start = time.perf_counter()
+            resp  = client.post("/nearby-ambulance-services", json={"text": "Delhi"})
+            timings.append(time.perf_counter() - start)
+            found = len(resp.get_json()["ambulance_services"])
+        print(f"{workers:>8} {statistics.median(timings):>9.2f} {max(timings):>9.2f} {found:>9}")
+        ambulance.details_executor.shutdown(wait=True)
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Exercise /call-ambulance sync vs async dispatch against local Places and Bland stubs.
+
+    python benchmarks/bench_call_dispatch.py [--users 10] [--clicks 2] [--fail-first 3] [--fail-after-placing 3]
+
+Each simulated user double-clicks (sends the same request `--clicks` times);
+the stub Bland server should see exactly one call per user, including users
+whose call was placed but answered with a 503.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stub_bland import start_stub_bland
+from benchmarks.stub_places import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--clicks", type=int, default=2)
+    parser.add_argument("--fail-first", type=int, default=3)
+    parser.add_argument("--fail-after-placing", type=int, default=3)
+    parser.add_argument("--bland-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    places, places_url = start_stub_server(latency=(0.2, 0.4))
+    bland, bland_url   = start_stub_bland(latency=args.bland_latency, fail_first=args.fail_first)
+    os.environ["GOOGLE_MAPS_BASE_URL"] = places_url
+    os.environ["BLAND_API_URL"]        = bland_url
+    os.environ.setdefault("CALL_DISPATCH_BACKOFF", "0.2")
+    import ambulance
+    logging.getLogger().setLevel(logging.WARNING)
+    client = ambulance.app.test_client()
+
+    def request(user, dispatch):
+        body = {"name": f"Stub {user}", "phone_number": f"98000{user:05d}", "confirm": True,
+                "lat": 28.6 + user * 0.01, "lng": 77.2, "async": dispatch}
+        start = time.perf_counter()
+        resp  = client.post("/call-ambulance", json=body)
+        return time.perf_counter() - start, resp.status_code, resp.get_json()
+
+    bland.fail_first = 0
+    sync = [request(u, False) for u in range(3)]
+    print(f"sync   p50 response time: {statistics.median(t for t, _, _ in sync):.3f}s")
+
+    bland.requests, bland.calls, bland.fail_first = 0, [], args.fail_first
+    bland.fail_after_placing = args.fail_after_placing
+    jobs = [(u, c) for u in range(100, 100 + args.users) for c in range(args.clicks)]
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        results = list(pool.map(lambda uc: request(uc[0], True), jobs))
+    print(f"async  p50 response time: {statistics.median(t for t, _, _ in results):.3f}s")
+    job_ids = {body["job_id"] for _, _, body in results}
+    print(f"requests: {len(results)}  distinct jobs: {len(job_ids)}")
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        statuses = [client.get(f"/call-status/{j}").get_json()["status"] for j in job_ids]
+        if all(s in ("completed", "failed", "unknown") for s in statuses):
+            break
+        time.sleep(0.1)
+    print(f"final statuses: { {s: statuses.count(s) for s in set(statuses)} }")
+    print(f"bland requests: {bland.requests}  calls placed: {len(bland.calls)}  lookups: {bland.lookups}")
+    print(f"dispatch stats: {ambulance.call_dispatcher.stats()}")
+    places.shutdown()
+    bland.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compare /nearby-ambulance-services tail latency with and without hedged Places calls.
+
+The stub Places server adds a long delay to a small share of responses, the
+way a slow Google backend does. The unhedged pass runs first and fills the
+per-host latency window that the hedge delay (p95) is taken from.
+
+    python benchmarks/bench_hedging.py [--runs 30] [--tail-rate 0.02] [--tail-delay 2.0]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.stub_places import start_stub_server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--results", type=int, default=10)
+    parser.add_argument("--tail-rate", type=float, default=0.02)
+    parser.add_argument("--tail-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=(0.05, 0.1), page_size=args.results, pages=1,
+                                         tail_rate=args.tail_rate, tail_delay=args.tail_delay)
+    os.environ["GOOGLE_MAPS_BASE_URL"] = base_url
+    os.environ.setdefault("GOOGLE_QPS", "500")
+    import ambulance
+    logging.getLogger().setLevel(logging.WARNING)
+    client = ambulance.app.test_client()
+    # Hedging is tracked per endpoint; add up the search and details endpoints
+    def hedge_totals():
+        snapshots = [s for e, s in ambulance.http_client.stats().items() if e.startswith(base_url)]
+        return {k: sum(s[k] for s in snapshots) for k in ('hedges', 'hedge_wins', 'hedge_saved_ms')}
+
+    print(f"{'hedge':>6} {'p50 (s)':>9} {'p95 (s)':>9} {'max (s)':>9} {'hedges':>7} {'wins':>5} {'saved (s)':>10}")
+    for hedge in (False, True):
+        ambulance.HEDGE_GOOGLE_CALLS = hedge
+        before  = hedge_totals()
+        timings = []
+        for _ in range(args.runs):
+            ambulance.place_cache.memory.clear()
+            start = time.perf_counter()
+            client.post("/nearby-ambulance-services", json={"text": "Delhi"})
+            timings.append(time.perf_counter() - start)
+        time.sleep(args.tail_delay)  # let losing primaries finish so savings are recorded
+        after = hedge_totals()
+        print(f"{'on' if hedge else 'off':>6} {statistics.median(timings):>9.2f} {percentile(timings, 0.95):>9.2f} "
+              f"{max(timings):>9.2f} {after['hedges'] - before['hedges']:>7} "
+              f"{after['hedge_wins'] - before['hedge_wins']:>5} "
+              f"{(after['hedge_saved_ms'] - before['hedge_saved_ms']) / 1000:>10.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Offline end-to-end load test for /chat, /classify and /diagnosis.
+
+Start the services with the replay LLM backend so no Groq quota is used and
+upstream latency is fixed by configuration rather than by Groq's variance:
+
+    LLM_MODE=replay LLM_REPLAY_TTFT_MS=300 LLM_REPLAY_TOKENS_PER_S=80 python chatbot.py
+    LLM_MODE=replay python document.py
+
+(Run once with LLM_MODE=record against the real API to capture responses
+into recordings/; without recordings, replay serves a canned diagnosis.)
+Chat prompts cycle through a small symptom list, so after the first round
+they are mostly answered by the response cache; set RESPONSE_CACHE_SIZE=0
+on chatbot.py to measure the LLM path alone. Then drive all three endpoints
+concurrently:
+
+    python benchmarks/bench_llm_load.py --concurrency 16 --duration 30 \\
+        [--chat-url http://localhost:3001] [--diagnosis-url http://localhost:3003] [--mix chat=6,classify=2,diagnosis=1]
+"""
+import argparse
+import io
+import itertools
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from PIL import Image
+
+SYMPTOMS = [
+    "fever and headache for 2 days",
+    "dry cough and sore throat since yesterday",
+    "itchy red rash on both forearms",
+    "stomach ache and nausea after eating",
+    "lower back pain when bending",
+    "runny nose, sneezing and watery eyes",
+    "burning sensation while urinating",
+    "dizziness and fatigue in the mornings",
+]
+
+REPORT = """Patient: Jane Doe  Age: 54  Gender: female
+Date: 12/03/2024
+Blood test: fasting glucose 142 mg/dL (high), HbA1c 7.1 %, blood pressure 150/95 mmHg.
+Symptoms: fatigue, headache, blurred vision.
+Medications: metformin 500 mg tablet twice daily.
+Impression: poorly controlled diabetes with hypertension.
+"""
+
+
+def skin_photo(seed):
+    rng = np.random.default_rng(seed)
+    pixels = (rng.random((480, 640, 3)) * 60 + np.array([180, 120, 100])).clip(0, 255).astype("uint8")
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+class Driver:
+    def __init__(self, chat_url, diagnosis_url, timeout):
+        self.chat_url = chat_url.rstrip("/")
+        self.diagnosis_url = diagnosis_url.rstrip("/")
+        self.timeout = timeout
+        self.photos = [skin_photo(seed) for seed in range(4)]
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def chat(self, n):
+        message = SYMPTOMS[n % len(SYMPTOMS)]
+        return self.session().post(f"{self.chat_url}/chat", data={"message": message}, timeout=self.timeout)
+
+    def classify(self, n):
+        files = {"file": (f"photo{n % 4}.jpg", self.photos[n % 4], "image/jpeg")}
+        return self.session().post(f"{self.chat_url}/classify", data={"message": SYMPTOMS[2]},
+                                   files=files, timeout=self.timeout)
+
+    def diagnosis(self, n):
+        files = {"file": ("report.txt", REPORT.encode(), "text/plain")}
+        return self.session().post(f"{self.diagnosis_url}/diagnosis", files=files, timeout=self.timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chat-url", default="http://localhost:3001")
+    parser.add_argument("--diagnosis-url", default="http://localhost:3003")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--mix", default="chat=6,classify=2,diagnosis=1")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    weights = {name: int(weight) for name, weight in (part.split("=") for part in args.mix.split(","))}
+    driver = Driver(args.chat_url, args.diagnosis_url, args.timeout)
+    endpoints = [name for name, weight in weights.items() for _ in range(weight)]
+    results = {name: {"latencies": [], "errors": 0} for name in weights}
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.monotonic() + args.duration
+
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        while time.monotonic() < deadline:
+            name = rng.choice(endpoints)
+            n = next(counter)
+            start = time.perf_counter()
+            try:
+                ok = getattr(driver, name)(n).status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    results[name]["latencies"].append(elapsed)
+                else:
+                    results[name]["errors"] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.concurrency} clients for {elapsed:.1f}s")
+    print(f"{'endpoint':>10} {'ok':>6} {'errors':>7} {'req/s':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for name, r in results.items():
+        lat = r["latencies"]
+        if not lat:
+            print(f"{name:>10} {0:>6} {r['errors']:>7} {0:>7.1f} {'-':>9} {'-':>9} {'-':>9}")
+            continue
+        print(f"{name:>10} {len(lat):>6} {r['errors']:>7} {len(lat) / elapsed:>7.1f} "
+              f"{statistics.median(lat) * 1000:>9.0f} {percentile(lat, 0.95) * 1000:>9.0f} "
+              f"{percentile(lat, 0.99) * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Decode time and peak RSS of skin image preprocessing: legacy path vs skin_classifier.load_image.
+
+The legacy path is what process_image used to do: full decode, convert,
+resize, float32 copy, then a second copy for the division. Each mode runs in
+its own subprocess so peak RSS is not shared between them.
+
+    python benchmarks/bench_preprocess.py [--megapixels 12] [--iterations 30]
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skin_classifier import load_image
+
+
+def legacy_load_image(file):
+    image = Image.open(file)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image = image.resize((224, 224))
+    image_array = np.asarray(image, dtype="float32")
+    return image_array.astype("float32") / 255.0
+
+
+MODES = {'legacy': legacy_load_image, 'lean': load_image}
+
+
+def photo_jpeg(megapixels):
+    """A smooth, photo-like JPEG (gradients compress like real photos, unlike noise)."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    x = np.linspace(0, 1, width, dtype="float32")
+    y = np.linspace(0, 1, height, dtype="float32")[:, None]
+    rgb = np.stack([np.sin(8 * x + 3 * y), np.cos(5 * y - 2 * x), np.sin(3 * x * y + 1)], axis=-1)
+    buf = io.BytesIO()
+    Image.fromarray(((rgb + 1) * 127.5).astype("uint8")).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux (the child would report the parent's
+    # peak), so prefer the per-process high-water mark when /proc is available.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(mode, data, iterations):
+    load = MODES[mode]
+    baseline = peak_rss_kb()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        out = load(io.BytesIO(data))
+        timings.append(time.perf_counter() - start)
+    peak = peak_rss_kb()
+    return {'p50_ms': statistics.median(timings) * 1000, 'max_ms': max(timings) * 1000,
+            'rss_growth_mb': (peak - baseline) / 1024, 'checksum': float(out.sum())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megapixels", type=float, default=12)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        with open(args.path, 'rb') as f:
+            data = f.read()
+        print(json.dumps(measure(args.mode, data, args.iterations)))
+        return
+
+    # Workers read the photo from disk so generating it does not inflate their peak RSS
+    data = photo_jpeg(args.megapixels)
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+        f.write(data)
+    print(f"{len(data) / 1e6:.1f} MB JPEG, {args.megapixels:g} MP")
+    print(f"{'mode':>8} {'p50 (ms)':>9} {'max (ms)':>9} {'RSS growth (MB)':>16}")
+    for mode in MODES:
+        cmd = [sys.executable, os.path.abspath(__file__), "--mode", mode,
+               "--path", f.name, "--iterations", str(args.iterations)]
+        r = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+        print(f"{mode:>8} {r['p50_ms']:>9.1f} {r['max_ms']:>9.1f} {r['rss_growth_mb']:>16.1f}")
+
+    legacy = legacy_load_image(io.BytesIO(data))
+    lean = load_image(io.BytesIO(data))
+    print(f"mean |legacy - lean| per pixel: {np.abs(legacy - lean).mean():.4f} (inputs are in [0, 1])")
+    os.remove(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Micro-benchmark: legacy per-item sort_doctors vs the vectorized RankingEngine.
+
+    python benchmarks/bench_ranking.py [--sizes 60 1000 100000] [--k 60]
+
+Candidates are synthetic doctors around Delhi. "legacy" is the original
+math-based haversine + full sort; "engine" builds the NumPy columns, computes
+all distances in one pass and uses top-k selection.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ranking import RankingEngine
+
+
+def legacy_distance(lat1, lng1, lat2, lng2):
+    R = 6371
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
+         math.sin(delta_lng / 2) ** 2)
+    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def legacy_sort(doctors, sort_by, lat, lng):
+    if sort_by == "distance":
+        for doctor in doctors:
+            loc = doctor.get('location')
+            doctor['distance'] = legacy_distance(lat, lng, loc['lat'], loc['lng']) if loc else float('inf')
+        return sorted(doctors, key=lambda x: x.get('distance', float('inf')))
+    return sorted(doctors, key=lambda x: (not x.get('open_now', False), -(x.get('rating') or 0)))
+
+
+def make_candidates(n, rng):
+    return [{
+        'id': f"doc-{i}",
+        'location': {'lat': 28.4 + rng.random() * 0.5, 'lng': 76.9 + rng.random() * 0.6},
+        'rating': rng.choice([None, round(rng.uniform(1, 5), 1)]),
+        'user_ratings_total': rng.randint(0, 2000),
+        'open_now': rng.random() < 0.6,
+    } for i in range(n)]
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 1000, 100000])
+    parser.add_argument("--k", type=int, default=60)
+    args = parser.parse_args()
+    rng = random.Random(42)
+    lat, lng = 28.61, 77.21
+
+    print(f"{'n':>8} {'mode':>9} {'legacy ms':>10} {'build ms':>9} {'rank ms':>8} {'engine ms':>10} {'speedup':>8}")
+    for n in args.sizes:
+        candidates = make_candidates(n, rng)
+        repeat = 20 if n <= 1000 else 3
+        for mode in ("rating", "distance", "score"):
+            legacy = timed(lambda: legacy_sort(list(candidates), "rating" if mode == "score" else mode, lat, lng), repeat)
+            build = timed(lambda: RankingEngine(candidates), repeat)
+            engine = RankingEngine(candidates)
+            rank = timed(lambda: engine.rank(mode, lat, lng, k=args.k), repeat)
+            total = build + rank
+            label = "rating*" if mode == "score" else mode
+            print(f"{n:>8} {mode:>9} {legacy * 1e3:>10.3f} {build * 1e3:>9.3f} {rank * 1e3:>8.3f} "
+                  f"{total * 1e3:>10.3f} {legacy / total:>7.1f}x")
+    print("* score has no legacy equivalent; compared against the legacy rating sort.")
+    print("rank ms alone is the cost once candidates live in a prebuilt (e.g. multi-region) index.")
+
+
+if __name__ == "__main__":
+    main()
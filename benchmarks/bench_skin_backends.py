@@ -0,0 +1,91 @@
+"""Compare skin model backends: latency, memory and top-1 agreement with Keras.
+
+Each backend runs in its own subprocess so peak RSS is measured in isolation.
+Conversion to TFLite happens on the first run and is cached next to the
+model (or in --cache-dir); later runs load the cached artifact directly.
+
+    python benchmarks/bench_skin_backends.py --images path/to/skin/photos \\
+        [--model skin_disease_model.h5] [--backends keras tflite-fp16 tflite-int8]
+
+Needs TensorFlow (or tflite_runtime for already-converted artifacts).
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from skin_classifier import BACKENDS, calibration_images, converted_model_path, load_backend
+
+
+def measure(args):
+    """Run inside the worker subprocess; prints one JSON line."""
+    images = calibration_images(args.images, limit=args.limit)
+    started = time.perf_counter()
+    predict = load_backend(args.model, args.backend, args.cache_dir, args.calibration or args.images)
+    load_seconds = time.perf_counter() - started
+    predict(np.zeros((1, 224, 224, 3), dtype="float32"))
+
+    latencies, top1 = [], []
+    for image in images:
+        start = time.perf_counter()
+        probs = predict(np.expand_dims(image, axis=0))[0]
+        latencies.append(time.perf_counter() - start)
+        top1.append(int(np.argmax(probs)))
+
+    artifact = args.model if args.backend == 'keras' else converted_model_path(args.model, args.backend, args.cache_dir)
+    print(json.dumps({
+        'backend': args.backend,
+        'load_s': load_seconds,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': sorted(latencies)[min(int(0.95 * len(latencies)), len(latencies) - 1)] * 1000,
+        'model_mb': os.path.getsize(artifact) / 1e6,
+        # ru_maxrss is in KiB on Linux
+        'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'top1': top1,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="directory of local evaluation images")
+    parser.add_argument("--model", default="skin_disease_model.h5")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--calibration", help="int8 calibration images (defaults to --images)")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        return measure(args)
+
+    results = {}
+    for backend in args.backends:
+        cmd = [sys.executable, os.path.abspath(__file__), "--backend", backend,
+               "--images", args.images, "--model", args.model, "--limit", str(args.limit)]
+        if args.cache_dir:
+            cmd += ["--cache-dir", args.cache_dir]
+        if args.calibration:
+            cmd += ["--calibration", args.calibration]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results[backend] = json.loads(out.strip().splitlines()[-1])
+
+    reference = results.get('keras', {}).get('top1')
+    print(f"{'backend':>12} {'load (s)':>9} {'p50 (ms)':>9} {'p95 (ms)':>9} {'file (MB)':>10} "
+          f"{'RSS (MB)':>9} {'top-1 agree':>12}")
+    for backend, r in results.items():
+        agree = (f"{np.mean(np.array(r['top1']) == np.array(reference)) * 100:.1f}%"
+                 if reference and len(reference) == len(r['top1']) else "n/a")
+        print(f"{backend:>12} {r['load_s']:>9.2f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['model_mb']:>10.1f} "
+              f"{r['rss_mb']:>9.0f} {agree:>12}")
+
+
+if __name__ == "__main__":
+    main()
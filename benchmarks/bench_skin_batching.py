@@ -0,0 +1,92 @@
+"""Throughput and latency of skin classification with and without micro-batching.
+
+By default a synthetic model stands in for skin_disease_model.h5: each call
+costs a fixed overhead plus a per-image cost and calls are serialized, which
+is how Keras predict behaves on a CPU node. Pass --model to measure the real
+model instead (needs TensorFlow).
+
+    python benchmarks/bench_skin_batching.py [--clients 1 8 32] [--requests 256]
+    python benchmarks/bench_skin_batching.py --model skin_disease_model.h5
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from batcher import MicroBatcher
+
+NUM_CLASSES = 23
+
+
+class SyntheticModel:
+    def __init__(self, call_overhead=0.03, per_image=0.004):
+        self.call_overhead = call_overhead
+        self.per_image = per_image
+        self.weights = np.random.default_rng(0).standard_normal((224 * 224 * 3 // 64, NUM_CLASSES)).astype("float32")
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, batch):
+        with self._lock:
+            time.sleep(self.call_overhead + self.per_image * len(batch))
+            logits = batch.reshape(len(batch), -1)[:, ::64] @ self.weights
+            e = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return e / e.sum(axis=1, keepdims=True)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def run(predict_one, clients, requests_total, image):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        predict_one(image)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(requests_total)))
+    elapsed = time.perf_counter() - start
+    return requests_total / elapsed, statistics.median(latencies), percentile(latencies, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--model")
+    args = parser.parse_args()
+
+    if args.model:
+        from tensorflow.keras.models import load_model
+        model = load_model(args.model)
+    else:
+        model = SyntheticModel()
+    image = np.random.default_rng(1).random((224, 224, 3), dtype=np.float32)
+    batcher = MicroBatcher(model.predict_on_batch, max_batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000)
+    modes = {
+        "single": lambda x: model.predict_on_batch(np.expand_dims(x, axis=0))[0],
+        "batched": batcher.predict,
+    }
+
+    print(f"{'mode':>8} {'clients':>8} {'img/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    for clients in args.clients:
+        for mode, predict_one in modes.items():
+            throughput, p50, p95 = run(predict_one, clients, args.requests, image)
+            print(f"{mode:>8} {clients:>8} {throughput:>8.1f} {p50 * 1000:>9.1f} {p95 * 1000:>9.1f}")
+    print(f"batcher: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Local stand-in for the Bland AI /v1/calls endpoint.
+
+Fails the first `fail_first` requests with 503 without placing a call, then
+places the next `fail_after_placing` calls but still answers 503, so both
+sides of an unknown outcome can be observed. Every placed call is recorded
+and listed by GET /v1/calls?to_number=...
+"""
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubBlandHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body   = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            failing = server.requests <= server.fail_first
+            placed_but_failing = (not failing
+                                  and server.requests <= server.fail_first + server.fail_after_placing)
+            if not failing:
+                call = {"call_id": uuid.uuid4().hex, "to": body.get("phone_number"),
+                        "metadata": body.get("metadata") or {},
+                        "created_at": datetime.now(timezone.utc).isoformat()}
+                server.calls.append(call)
+        if failing or placed_but_failing:
+            self.send_json(503, {"status": "error", "message": "stub overloaded"})
+        else:
+            self.send_json(200, {"status": "success", "call_id": call["call_id"]})
+
+    def do_GET(self):
+        server = self.server
+        to_number = parse_qs(urlsplit(self.path).query).get("to_number", [None])[0]
+        with server.lock:
+            server.lookups += 1
+            calls = [c for c in server.calls if to_number is None or c["to"] == to_number]
+        self.send_json(200, {"count": len(calls), "calls": calls})
+
+    def send_json(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_stub_bland(latency=0.5, fail_first=0, fail_after_placing=0):
+    """Start the stub on a free local port; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubBlandHandler)
+    server.daemon_threads = True
+    server.latency    = latency
+    server.fail_first = fail_first
+    server.fail_after_placing = fail_after_placing
+    server.requests   = 0
+    server.lookups    = 0
+    server.calls      = []
+    server.lock       = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
@@ -0,0 +1,106 @@
+"""Local stand-in for the Google Places/Geocode endpoints used by the benchmarks.
+
+Every response is synthetic and served after a configurable delay so the
+services can be exercised offline with realistic upstream latency.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubPlacesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url    = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        delay = random.uniform(*server.latency)
+        if random.random() < server.tail_rate:
+            delay += server.tail_delay
+        time.sleep(delay)
+        server.hits[url.path] = server.hits.get(url.path, 0) + 1
+
+        if url.path.endswith("/place/nearbysearch/json") or url.path.endswith("/place/textsearch/json"):
+            body = self.search_page(params)
+        elif url.path.endswith("/place/details/json"):
+            body = self.details(params.get("place_id", ""))
+        elif url.path.endswith("/place/photo"):
+            return self.send_photo(int(params.get("maxwidth", 400)))
+        elif url.path.endswith("/geocode/json"):
+            body = {"status": "OK", "results": [{"formatted_address": f"Stub address near {params.get('latlng')}"}]}
+        else:
+            body = {"status": "INVALID_REQUEST"}
+        self.send_json(body)
+
+    def search_page(self, params):
+        page = int(params.get("pagetoken") or 0)
+        lat, lng = (float(x) for x in (params.get("location") or "28.6,77.2").split(","))
+        results = []
+        for i in range(self.server.page_size):
+            n = page * self.server.page_size + i
+            results.append({
+                "place_id":           f"stub-{n}",
+                "name":               f"Stub Place {n}",
+                "vicinity":           f"{n} Stub Road",
+                "geometry":           {"location": {"lat": lat + (n % 7) * 0.01, "lng": lng + (n % 5) * 0.01}},
+                "rating":             round(3 + (n % 20) / 10, 1),
+                "user_ratings_total": n * 3,
+                "opening_hours":      {"open_now": n % 2 == 0},
+                "types":              ["doctor", "health"],
+                "photos":             [{"photo_reference": f"photo-{n}"}],
+            })
+        body = {"status": "OK", "results": results}
+        if page + 1 < self.server.pages:
+            body["next_page_token"] = str(page + 1)
+        return body
+
+    def details(self, place_id):
+        n = int(place_id.rsplit("-", 1)[-1]) if place_id.rsplit("-", 1)[-1].isdigit() else 0
+        return {"status": "OK", "result": {
+            "name":                   f"Stub Place {n}",
+            "formatted_phone_number": f"0{9800000000 + n}",
+            "opening_hours":          {"open_now": n % 2 == 0},
+            "website":                f"https://example.invalid/{n}",
+        }}
+
+    def send_photo(self, width):
+        import io
+        from PIL import Image
+        buf = io.BytesIO()
+        Image.new("RGB", (width, width * 3 // 4), (120, 160, 200)).save(buf, "JPEG")
+        payload = buf.getvalue()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, body):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start_stub_server(latency=(0.2, 0.4), page_size=20, pages=2, handler=StubPlacesHandler,
+                      tail_rate=0.0, tail_delay=0.0):
+    """Start the stub on a free local port; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.latency    = latency
+    server.tail_rate  = tail_rate
+    server.tail_delay = tail_delay
+    server.page_size  = page_size
+    server.pages      = pages
+    server.hits       = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/maps/api"
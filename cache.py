@@ -0,0 +1,370 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Return a live entry without touching recency or counters."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expired': self.expired,
+        }
+
+class StaleWhileRevalidateCache:
+    """Bounded cache that serves stale entries while a background load refreshes them.
+
+    Entries younger than `fresh_ttl` are served as-is. Entries up to
+    `fresh_ttl + stale_ttl` old are still served immediately, and one
+    background refresh per key is started. Older entries and misses are loaded
+    inline. Memory is bounded by `max_entries` and by `max_bytes` as measured
+    by `sizeof`; the least recently used entries are evicted first. When
+    `replaces(old, new)` is given, a new value only overwrites a live entry if
+    it returns True.
+    """
+
+    def __init__(self, fresh_ttl=300, stale_ttl=3600, max_entries=512, max_bytes=None,
+                 sizeof=None, max_workers=2, replaces=None):
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.replaces = replaces
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="swr-refresh")
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+
+    def get(self, key, loader, refresh=None):
+        """Return (value, state) where state is 'fresh', 'stale' or 'miss'.
+
+        Misses are loaded with `loader`; stale entries are refreshed in the
+        background with `refresh`, or `loader` when it is not given.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, stored_at, _ = entry
+                age = now - stored_at
+                if age <= self.fresh_ttl:
+                    self._data.move_to_end(key)
+                    self.fresh_hits += 1
+                    return value, 'fresh'
+                if age <= self.fresh_ttl + self.stale_ttl:
+                    self._data.move_to_end(key)
+                    self.stale_hits += 1
+                    self._schedule(key, refresh or loader)
+                    return value, 'stale'
+            self.misses += 1
+        value = loader()
+        self.set(key, value)
+        return value, 'miss'
+
+    def refresh(self, key, loader):
+        """Reload key in the background now, unless a reload is already running."""
+        with self._lock:
+            self._schedule(key, loader)
+
+    def _schedule(self, key, loader):
+        if key not in self._refreshing:
+            self._refreshing.add(key)
+            self._executor.submit(self._refresh, key, loader)
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader())
+            self.refreshes += 1
+        except Exception:
+            self.refresh_errors += 1
+            logger.exception(f"Background refresh failed for {key}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._data.get(key)
+            if (old is not None and self.replaces is not None
+                    and time.monotonic() - old[1] <= self.fresh_ttl + self.stale_ttl
+                    and not self.replaces(old[0], value)):
+                return
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (value, time.monotonic(), size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes and len(self._data) > 1):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        lookups = self.fresh_hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'fresh_hits': self.fresh_hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.fresh_hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'evictions': self.evictions,
+        }
+
+
+# Phone numbers and names almost never change; open_now flips during the day.
+PLACE_FIELD_TTLS = {
+    'name': 30 * 86400,
+    'formatted_phone_number': 7 * 86400,
+    'website': 7 * 86400,
+    'price_level': 7 * 86400,
+    'reviews': 86400,
+    'opening_hours': 15 * 60,
+}
+DEFAULT_FIELD_TTL = 86400
+
+
+class PlaceDetailsCache:
+    """Place details cache with an LRU memory tier and an optional SQLite tier.
+
+    Fields are cached individually with their own TTL, so a lookup only counts
+    as a hit when every requested field is present and fresh. Fields Google did
+    not return are cached as absent so they are not re-fetched either.
+    """
+
+    def __init__(self, max_entries=2048, db_path=None, field_ttls=None):
+        self.field_ttls = dict(PLACE_FIELD_TTLS, **(field_ttls or {}))
+        self.memory = LRUCache(max_entries=max_entries)
+        self.db_path = db_path
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.fetch_errors = 0
+        self.flight = SingleFlight()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS place_fields ("
+                " place_id TEXT NOT NULL, field TEXT NOT NULL, value TEXT,"
+                " fetched_at REAL NOT NULL, PRIMARY KEY (place_id, field))"
+            )
+            self._db.commit()
+
+    def ttl_for(self, field):
+        return self.field_ttls.get(field, DEFAULT_FIELD_TTL)
+
+    def _fresh(self, entry, fields, now):
+        if entry is None:
+            return False
+        for field in fields:
+            cached = entry.get(field)
+            if cached is None or now - cached[1] > self.ttl_for(field):
+                return False
+        return True
+
+    @staticmethod
+    def _project(entry, fields):
+        return {f: entry[f][0] for f in fields if entry[f][0] is not None}
+
+    def _load_from_disk(self, place_id):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT field, value, fetched_at FROM place_fields WHERE place_id = ?", (place_id,)
+            ).fetchall()
+        return {field: (json.loads(value), fetched_at) for field, value, fetched_at in rows}
+
+    def get(self, place_id, fields):
+        """Return the cached subset of fields for place_id, or None if any is missing or stale."""
+        now = time.time()
+        entry = self.memory.get(place_id)
+        if self._fresh(entry, fields, now):
+            with self._lock:
+                self.memory_hits += 1
+            return self._project(entry, fields)
+        if self._db is not None:
+            disk_entry = self._load_from_disk(place_id)
+            if self._fresh(disk_entry, fields, now):
+                with self._lock:
+                    # Merge with whatever a concurrent put stored meanwhile; newer fields win
+                    entry = self._merge(self.memory.peek(place_id) or {}, disk_entry)
+                    self.memory.set(place_id, entry)
+                    self.disk_hits += 1
+                return self._project(entry, fields)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    @staticmethod
+    def _merge(entry, updates):
+        merged = dict(entry)
+        merged.update({f: v for f, v in updates.items() if f not in entry or v[1] >= entry[f][1]})
+        return merged
+
+    def put(self, place_id, fields, result):
+        now = time.time()
+        updates = {field: (result.get(field), now) for field in fields}
+        with self._lock:
+            self.memory.set(place_id, self._merge(self.memory.peek(place_id) or {}, updates))
+        if self._db is not None:
+            with self._db_lock:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO place_fields (place_id, field, value, fetched_at) VALUES (?, ?, ?, ?)",
+                    [(place_id, field, json.dumps(value), fetched_at) for field, (value, fetched_at) in updates.items()],
+                )
+                self._db.commit()
+
+    def get_or_fetch(self, place_id, fields, fetch, source=None):
+        """Serve fields from cache, otherwise call fetch() and cache its result.
+
+        fetch returns the Places `result` dict, or None when there is nothing
+        to cache, and may raise; neither is cached. Concurrent misses for the
+        same place share a single fetch. When a source dict is given,
+        source['cached'] says whether the answer came from the cache.
+        """
+        cached = self.get(place_id, fields)
+        if source is not None:
+            source['cached'] = cached is not None
+        if cached is not None:
+            return cached
+        return self.flight.do((place_id, tuple(fields)), lambda: self._fetch(place_id, fields, fetch))
+
+    def _fetch(self, place_id, fields, fetch):
+        try:
+            result = fetch()
+        except Exception:
+            with self._lock:
+                self.fetch_errors += 1
+            raise
+        if result is None:
+            with self._lock:
+                self.fetch_errors += 1
+            return None
+        self.put(place_id, fields, result)
+        return {f: result[f] for f in fields if result.get(f) is not None}
+
+    def stats(self):
+        with self._lock:
+            memory_hits, disk_hits, misses, fetch_errors = (
+                self.memory_hits, self.disk_hits, self.misses, self.fetch_errors)
+        lookups = memory_hits + disk_hits + misses
+        return {
+            'memory_hits': memory_hits,
+            'disk_hits': disk_hits,
+            'misses': misses,
+            'fetch_errors': fetch_errors,
+            'hit_rate': round((memory_hits + disk_hits) / lookups, 4) if lookups else 0.0,
+            'memory': self.memory.stats(),
+            'disk_enabled': self._db is not None,
+            'singleflight': self.flight.stats(),
+        }
+
+
+_place_cache = None
+_place_cache_lock = threading.Lock()
+
+
+def get_place_cache():
+    """Process-wide place details cache, configured from PLACE_CACHE_SIZE / PLACE_CACHE_DB."""
+    global _place_cache
+    with _place_cache_lock:
+        if _place_cache is None:
+            _place_cache = PlaceDetailsCache(
+                max_entries=int(os.getenv("PLACE_CACHE_SIZE", "2048")),
+                db_path=os.getenv("PLACE_CACHE_DB") or None,
+            )
+        return _place_cache
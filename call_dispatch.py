@@ -0,0 +1,184 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableCallError(Exception):
+    """The provider certainly did not place the call (connect failure, 429); retried with backoff."""
+
+
+class CallOutcomeUnknown(Exception):
+    """The request may have reached the provider (read error, 5xx); the call may or may not exist."""
+
+
+class CallFailedError(Exception):
+    """Permanent failure; the job fails without further attempts."""
+
+    def __init__(self, message, details=None, status_code=None):
+        super().__init__(message)
+        self.details = details
+        self.status_code = status_code
+
+
+_UNVERIFIED = object()
+FINISHED = ('completed', 'failed', 'unknown')
+
+
+class CallDispatcher:
+    """Background worker pool for outbound calls with retries and idempotency keys.
+
+    `place_call(payload, report)` does the actual work; it may call
+    `report(status)` to publish progress, returns the provider response on
+    success, and raises RetryableCallError, CallOutcomeUnknown or
+    CallFailedError on failure. Placing a call is not idempotent, so only
+    RetryableCallError is retried straight away. After CallOutcomeUnknown the
+    job is 'verifying': `find_call(payload, since)` is asked whether the
+    provider has a call for this job placed since `since` (epoch seconds) and
+    returns it, or None if there is none. A found call completes the job and
+    a confirmed absence lets it retry. If the provider cannot be asked, or
+    there is no `find_call`, the job ends as 'unknown' and is never placed
+    again automatically.
+    Submitting the same idempotency key again returns the existing job instead
+    of placing a second call while that job is still in flight, or for `ttl`
+    seconds after it was created (default `idempotency_ttl`), unless it failed.
+    Keys derived from the request body should pass a short `ttl`, so only a
+    double-click is absorbed and a deliberate re-dial places a new call.
+    """
+
+    def __init__(self, place_call, find_call=None, max_workers=4, max_attempts=3, backoff=1.0,
+                 idempotency_ttl=300, job_ttl=3600):
+        self.place_call = place_call
+        self.find_call = find_call
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idempotency_ttl = idempotency_ttl
+        self.job_ttl = job_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="call-dispatch")
+        self._jobs = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.deduplicated = 0
+
+    def submit(self, payload, idempotency_key, ttl=None):
+        """Enqueue a call job; returns (job snapshot, created)."""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            job_id, _ = self._keys.get(idempotency_key, (None, None))
+            if job_id is not None and self._jobs[job_id]['status'] != 'failed':
+                self.deduplicated += 1
+                return self._snapshot(self._jobs[job_id]), False
+            job_id = uuid.uuid4().hex
+            job = {
+                'job_id': job_id,
+                'status': 'queued',
+                'attempts': 0,
+                'created_at': now,
+                'updated_at': now,
+                'idempotency_key': idempotency_key,
+                'payload': payload,
+                'result': None,
+                'error': None,
+            }
+            self._jobs[job_id] = job
+            self._keys[idempotency_key] = (job_id, self.idempotency_ttl if ttl is None else ttl)
+            self.submitted += 1
+        self._executor.submit(self._run, job_id)
+        return self._snapshot(job), True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+
+    def _sleep(self, attempt):
+        time.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+
+    def _verify(self, job_id, payload, since):
+        """The provider's call for this job, None if it has none, or _UNVERIFIED if it cannot tell us."""
+        if self.find_call is None:
+            return _UNVERIFIED
+        for attempt in range(1, self.max_attempts + 1):
+            # Give the provider time to register a call it accepted just before failing.
+            self._sleep(attempt)
+            try:
+                return self.find_call(payload, since)
+            except Exception as e:
+                logger.warning(f"Call job {job_id} lookup {attempt} failed: {e}")
+        return _UNVERIFIED
+
+    def _run(self, job_id):
+        with self._lock:
+            payload = self._jobs[job_id]['payload']
+            since = self._jobs[job_id]['created_at']
+        for attempt in range(1, self.max_attempts + 1):
+            self._update(job_id, status='placing', attempts=attempt)
+            try:
+                result = self.place_call(payload, lambda status: self._update(job_id, status=status))
+            except RetryableCallError as e:
+                logger.warning(f"Call job {job_id} attempt {attempt} failed: {e}")
+                if attempt == self.max_attempts:
+                    self._update(job_id, status='failed', error=str(e))
+                    return
+                self._update(job_id, status='retrying', error=str(e))
+                self._sleep(attempt)
+            except CallOutcomeUnknown as e:
+                logger.warning(f"Call job {job_id} attempt {attempt} has an unknown outcome: {e}")
+                self._update(job_id, status='verifying', error=str(e))
+                existing = self._verify(job_id, payload, since)
+                if existing is _UNVERIFIED:
+                    self._update(job_id, status='unknown',
+                                 error=f"{e}; could not confirm whether the call was placed")
+                    return
+                if existing is not None:
+                    self._update(job_id, status='completed', result=existing, error=None)
+                    return
+                if attempt == self.max_attempts:
+                    self._update(job_id, status='failed', error=str(e))
+                    return
+                self._update(job_id, status='retrying', error=str(e))
+            except CallFailedError as e:
+                self._update(job_id, status='failed', error={'message': str(e), 'details': e.details})
+                return
+            except Exception as e:
+                logger.exception(f"Call job {job_id} crashed")
+                self._update(job_id, status='failed', error=str(e))
+                return
+            else:
+                self._update(job_id, status='completed', result=result, error=None)
+                return
+
+    def _expire(self, now):
+        for key, (job_id, ttl) in list(self._keys.items()):
+            job = self._jobs.get(job_id)
+            if job is None or (job['status'] in FINISHED and now - job['created_at'] > ttl):
+                del self._keys[key]
+        for job_id, job in list(self._jobs.items()):
+            if job['status'] in FINISHED and now - job['updated_at'] > self.job_ttl:
+                del self._jobs[job_id]
+
+    @staticmethod
+    def _snapshot(job):
+        return {k: v for k, v in job.items() if k != 'payload'}
+
+    def stats(self):
+        with self._lock:
+            by_status = {}
+            for job in self._jobs.values():
+                by_status[job['status']] = by_status.get(job['status'], 0) + 1
+        return {
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'jobs': by_status,
+        }
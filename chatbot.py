@@ -6,26 +6,53 @@ from phi.llm.groq import Groq
 import os
 from flask_cors import CORS
 from dotenv import load_dotenv
-from PIL import Image
 import numpy as np
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing.image import img_to_array
 import json
+import io
+import hashlib
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from cache import LRUCache
+from singleflight import SingleFlight
+from streaming import requested_stream_format, stream_records
+from sessions import ConversationStore, UnknownConversation
+from response_cache import ResponseCache
+from skin_classifier import ModelNotReady, SkinClassifier, load_image
+from llm_replay import assistant_llm, llm_backend_from_env
+from server_timing import StageTimer
 
 app = Flask(__name__)
 CORS(app)
 load_dotenv(".env.local")
 
+# LLM_MODE=record saves every Groq response; LLM_MODE=replay serves recorded
+# responses with synthetic latency and never calls Groq (no key needed).
+llm_backend = llm_backend_from_env("chatbot")
+
 groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
+if not groq_api_key and not (llm_backend and llm_backend.mode == "replay"):
     raise ValueError("GROQ_API_KEY is not set in environment variables!")
-os.environ["GROQ_API_KEY"] = groq_api_key
+if groq_api_key:
+    os.environ["GROQ_API_KEY"] = groq_api_key
 
-try:
-    skin_model = load_model("skin_disease_model.h5")
-    print("Model loaded successfully.")
-except Exception as e:
-    raise RuntimeError(f"Failed to load model: {e}")
+# The skin model loads on a background thread so the API (and text-only /chat)
+# is up immediately. Image requests wait up to SKIN_MODEL_WAIT_SECONDS for it.
+# Concurrent uploads share batched forward passes: images queued within
+# SKIN_BATCH_MAX_WAIT_MS of each other (up to SKIN_BATCH_SIZE) run together.
+# SKIN_MODEL_BACKEND picks keras (full precision) or a quantized TFLite copy
+# (tflite-fp16 / tflite-int8) for CPU-only nodes. A failed load is retried
+# after SKIN_MODEL_RETRY_SECONDS, doubling up to five minutes.
+SKIN_MODEL_WAIT_SECONDS = float(os.getenv("SKIN_MODEL_WAIT_SECONDS", "10"))
+skin_classifier = SkinClassifier(
+    os.getenv("SKIN_MODEL_PATH", "skin_disease_model.h5"),
+    backend=os.getenv("SKIN_MODEL_BACKEND", "keras"),
+    cache_dir=os.getenv("SKIN_MODEL_CACHE_DIR") or None,
+    calibration_dir=os.getenv("SKIN_CALIBRATION_DIR") or None,
+    max_batch_size=int(os.getenv("SKIN_BATCH_SIZE", "16")),
+    max_wait=float(os.getenv("SKIN_BATCH_MAX_WAIT_MS", "5")) / 1000,
+    retry_backoff=float(os.getenv("SKIN_MODEL_RETRY_SECONDS", "5"))
+).start()
 
 class_labels = [
     "Acne and Rosacea Photos",
@@ -53,181 +80,423 @@ class_labels = [
     "Warts Molluscum and other Viral Infections"
 ]
 
-assistant = Assistant(
-    llm=Groq(model="llama-3.3-70b-versatile"),
-    tools=[PubmedTools()],
-    add_history_to_messages=True,
-    num_history_responses=3,
-    instructions=[
-        "Based on the given symptoms, determine the most probable disease. Include a confidence rating in your answer in the format 'Confidence: XX%'.",
-        "If your confidence is below 80%, ask clarifying questions.",
-        "Provide the diagnosis in a very neat and structured manner. Format responses with **Markdown** where necessary.",
-        "Use **bold text** and underlines for key terms like disease names, medications, and important instructions. Add proper spacing and bullet points as and when needed.",
-        "Include a proper **prescription format** if confidence is above 80%.",
-        "Ensure a structured and readable response using Markdown syntax.",
-        "Advice a medicine that would be suitable for pregnant women, old people and children",
-        "Also ask what associated diseases someone might have before suggesting a medicine eg: diabetes, epilepsy, asthama, tuberculosis",
-        "Make the response polite and upbeat please.",
-        "Provide a one liner summary in about 10 words in the following format: SUMMARY: _________",
-        "Provide the response in the same language as the language of the user's input",
-        "take all the diseases that match the symptoms into consideration before making a conclusion"
-    ],
-    show_tool_calls=True,
+# History lives in the per-conversation store below, not in Assistant memory:
+# each request gets a fresh Assistant so nothing leaks between users.
+ASSISTANT_INSTRUCTIONS = [
+    "Based on the given symptoms, determine the most probable disease. Include a confidence rating in your answer in the format 'Confidence: XX%'.",
+    "If your confidence is below 80%, ask clarifying questions.",
+    "Provide the diagnosis in a very neat and structured manner. Format responses with **Markdown** where necessary.",
+    "Use **bold text** and underlines for key terms like disease names, medications, and important instructions. Add proper spacing and bullet points as and when needed.",
+    "Include a proper **prescription format** if confidence is above 80%.",
+    "Ensure a structured and readable response using Markdown syntax.",
+    "Advice a medicine that would be suitable for pregnant women, old people and children",
+    "Also ask what associated diseases someone might have before suggesting a medicine eg: diabetes, epilepsy, asthama, tuberculosis",
+    "Make the response polite and upbeat please.",
+    "Provide a one liner summary in about 10 words in the following format: SUMMARY: _________",
+    "Provide the response in the same language as the language of the user's input",
+    "take all the diseases that match the symptoms into consideration before making a conclusion"
+]
+
+def build_llm():
+    if llm_backend is None:
+        return Groq(model="llama-3.3-70b-versatile")
+    inner = Groq(model="llama-3.3-70b-versatile") if llm_backend.mode == "record" else None
+    return assistant_llm(llm_backend, inner)
+
+def build_assistant():
+    return Assistant(
+        llm=build_llm(),
+        tools=[PubmedTools()],
+        add_history_to_messages=False,
+        instructions=ASSISTANT_INSTRUCTIONS,
+        show_tool_calls=True,
+    )
+
+# Clients start a server-side conversation with conversation_id "new", then
+# send the id they get back and only the new message; older turns are folded
+# into a rolling summary so each prompt's history stays within
+# SESSION_TOKEN_BUDGET tokens. Requests without a conversation_id store nothing.
+conversation_store = ConversationStore(
+    max_sessions=int(os.getenv("SESSION_MAX_CONVERSATIONS", "10000")),
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("SESSION_TTL", str(6 * 3600))),
+    token_budget=int(os.getenv("SESSION_TOKEN_BUDGET", "1500")),
+    summary_budget=int(os.getenv("SESSION_SUMMARY_BUDGET", "400"))
+)
+
+# Classifications are keyed by a hash of the uploaded bytes (and the backend),
+# so a photo re-sent on a later turn skips decoding and inference entirely.
+classification_cache = LRUCache(
+    max_entries=int(os.getenv("CLASSIFICATION_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("CLASSIFICATION_CACHE_TTL", "86400"))
 )
+classification_flight = SingleFlight()
+
+def classify_image_bytes(key, data):
+    image_array = load_image(io.BytesIO(data))
+    print(f"Image processed for prediction: shape={image_array.shape}")
+    predictions = skin_classifier.predict(image_array, wait=SKIN_MODEL_WAIT_SECONDS)
+    print(f"Raw predictions: {predictions}")
+    if predictions.shape[0] == 1:
+        class_id = int(predictions[0] > 0.5)
+        confidence = float(predictions[0]) * 100
+    else:
+        class_id = int(np.argmax(predictions))
+        confidence = float(np.max(predictions)) * 100
+    probabilities = predictions.astype("float32")
+    probabilities.flags.writeable = False
+    result = {
+        "class_id": class_id,
+        "class_name": class_labels[class_id] if class_id < len(class_labels) else "Unknown",
+        "confidence": confidence,
+        "probabilities": probabilities
+    }
+    classification_cache.set(key, result)
+    return result
 
-def process_image(file):
+def classify_upload(data):
+    """(class_id, class_name, confidence) for uploaded image bytes; repeated photos come from the cache"""
     try:
-        image = Image.open(file)
-        print(f"Original image mode: {image.mode}")
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        image = image.resize((224, 224))
-        image_array = img_to_array(image)
-        image_array = image_array.astype("float32") / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
-        print(f"Image processed for prediction: shape={image_array.shape}")
-        predictions = skin_model.predict(image_array)
-        print(f"Raw predictions: {predictions}")
-        if predictions.shape[1] == 1:
-            class_id = int(predictions[0][0] > 0.5)
-            confidence = float(predictions[0][0]) * 100
+        key = f"{skin_classifier.backend}:{hashlib.sha256(data).hexdigest()}"
+        result = classification_cache.get(key)
+        if result is None:
+            result = classification_flight.do(key, lambda: classify_image_bytes(key, data))
         else:
-            class_id = int(np.argmax(predictions[0]))
-            confidence = float(np.max(predictions[0])) * 100
-        class_name = class_labels[class_id] if class_id < len(class_labels) else "Unknown"
-        return class_id, class_name, confidence
+            print(f"Classification cache hit for {key}")
+        return result["class_id"], result["class_name"], result["confidence"]
     except Exception as e:
         print("Image classification error:", e)
         raise e
 
-@app.route('/')
-def home():
-    return "Welcome to the Diagnosis API. Please POST your data to /chat or /classify."
+CONFIDENCE_RE = re.compile(r"Confidence:\s*(\d+)%")
+SUMMARY_RE = re.compile(r"SUMMARY:")
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    print("📨 Received request to /chat")
-    message = request.form.get("message") or (request.json.get("message") if request.is_json else None)
-    print(message)
-    if not message:
-        return jsonify({"error": "No message provided"}), 400
-    message = message.strip()
-    if not message:
-        return jsonify({"error": "Empty message provided"}), 400
-    user_history = request.form.get("history")
-    conversation_history = []
-    if user_history:
-        try:
-            history_list = json.loads(user_history)
-            if isinstance(history_list, list):
-                conversation_history = [f"**User:** {msg.get('content', '').strip()}" for msg in history_list if msg.get('content')]
-        except Exception as e:
-            print("History parsing error:", e)
-    else:
+class DiagnosisFieldParser:
+    """Pick the Confidence and SUMMARY fields out of a diagnosis while it streams in.
+
+    Each chunk only rescans the new text plus a short overlap, so a label
+    split across chunks is still found without re-searching the whole
+    response on every token.
+    """
+    OVERLAP = 32
+
+    def __init__(self):
+        self.text = ""
+        self.confidence = None
+        self.summary = None
+        self._scanned = 0
+        self._summary_at = None
+
+    def feed(self, chunk):
+        self.text += chunk
+        start = max(self._scanned - self.OVERLAP, 0)
+        self._scanned = len(self.text)
+        if self.confidence is None:
+            match = CONFIDENCE_RE.search(self.text, start)
+            if match:
+                self.confidence = int(match.group(1))
+        if self._summary_at is None:
+            match = SUMMARY_RE.search(self.text, start)
+            if match:
+                self._summary_at = match.end()
+        if self._summary_at is not None and self.summary is None:
+            line, newline, _ = self.text[self._summary_at:].lstrip().partition("\n")
+            if newline:
+                self.summary = line.strip(" *") or None
+
+    def finish(self):
+        if self._summary_at is not None and self.summary is None:
+            self.summary = self.text[self._summary_at:].strip(" *\n") or None
+        return self
+
+TRUTHY = frozenset({"1", "true", "yes", "on"})
+
+# Single-turn prompts (no earlier turns in the conversation) are answered from
+# a response cache: exact matches on the normalized message and image class,
+# or near-duplicates whose MinHash similarity reaches RESPONSE_CACHE_THRESHOLD
+# and whose clinical terms (negations, numbers, drug and condition names) are
+# identical. RESPONSE_CACHE_NEAR=0 serves exact matches only.
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.8")),
+    near=os.getenv("RESPONSE_CACHE_NEAR", "1").lower() in TRUTHY
+)
+
+def cached_response(cache_key):
+    """(cached output or None, cache state) for a (message, image class) key; None bypasses the cache"""
+    if cache_key is None:
+        response_cache.bypass()
+        return None, "bypass"
+    message, scope = cache_key
+    return response_cache.get(message, scope)
+
+def store_response(cache_key, output):
+    if cache_key is not None:
+        message, scope = cache_key
+        response_cache.set(message, output, scope=scope)
+
+def stream_diagnosis(prompt, image_classification, conversation_id, user_turn, cache_key=None, timer=None):
+    """Records for a streamed diagnosis: start, one token per chunk, then done (or error)."""
+    timer = timer or StageTimer()
+    with timer.stage("cache"):
+        cached, cache_state = cached_response(cache_key)
+    yield {"type": "start", "conversation_id": conversation_id, "cache": cache_state,
+           "image_classification": image_classification}
+    parser = DiagnosisFieldParser()
+    try:
+        with timer.stage("llm"):
+            for chunk in [cached] if cached is not None else build_assistant().chat(prompt):
+                parser.feed(chunk)
+                yield {"type": "token", "text": chunk}
+    except Exception as e:
+        print("Error during assistant.chat:", e)
+        yield {"type": "error", "error": str(e)}
+        return
+    parser.finish()
+    print("Assistant response streamed.")
+    with timer.stage("store"):
+        if cached is None:
+            store_response(cache_key, parser.text.strip())
+        record_turns(conversation_id, user_turn, parser.text)
+    yield {
+        "type": "done",
+        "conversation_id": conversation_id,
+        "cache": cache_state,
+        "response": f"**Diagnosis**\n\n{parser.text.strip()}",
+        "confidence": parser.confidence,
+        "summary": parser.summary,
+        "image_classification": image_classification,
+        "timings": timer.as_dict()
+    }
+
+def user_turn_text(message, class_name=None, confidence_score=None):
+    text = message or ""
+    if class_name is not None:
+        text += f"\n[Uploaded photo classified as {class_name} ({confidence_score:.0f}%)]"
+    return text.strip()
+
+def record_turns(conversation_id, user_turn, output):
+    if conversation_id is None:
+        return
+    try:
+        conversation_store.append(conversation_id, "user", user_turn)
+        conversation_store.append(conversation_id, "assistant", output)
+    except UnknownConversation:
+        print(f"Conversation {conversation_id} expired before its turns were recorded")
+
+NEW_CONVERSATION = "new"
+
+class ChatRequest:
+    """The fields /chat and /classify use, read from the JSON or multipart body in one pass."""
+
+    def __init__(self, req):
+        data = req.get_json(silent=True) if req.is_json else None
+        fields = data if isinstance(data, dict) else req.form
+        self.stream_format = requested_stream_format(fields, req)
+        message = fields.get("message")
+        self.message_sent = bool(message)
+        self.message = str(message).strip() if message else ""
+        conversation_id = str(fields.get("conversation_id") or "").strip()
+        self.new_conversation = conversation_id == NEW_CONVERSATION
+        self.conversation_id = None if self.new_conversation else conversation_id or None
+        # Client-held history is only used by clients that don't use a server-side conversation.
+        self.history = None if conversation_id else fields.get("history")
+        self.parallel = str(fields.get("parallel", "")).lower() in TRUTHY
+        upload = req.files.get("file")
+        self.image = upload.read() if upload is not None else None
+
+def load_history(chat_request):
+    """Prompt lines for the conversation so far, from the server-side store or the client's history"""
+    if chat_request.conversation_id:
+        return [conversation_store.context(chat_request.conversation_id)]
+    history = chat_request.history
+    if not history:
+        return []
+    try:
+        history_list = json.loads(history) if isinstance(history, str) else history
+        if isinstance(history_list, list):
+            return [f"**User:** {msg.get('content', '').strip()}" for msg in history_list
+                    if isinstance(msg, dict) and msg.get('content')]
+    except Exception as e:
+        print("History parsing error:", e)
+    return []
+
+def image_prompt_info(class_id, class_name, confidence_score):
+    if confidence_score is None or confidence_score < 80:
+        return ""
+    return (
+        f"\n\nImage-based classification:\n"
+        f"- Class ID: {class_id}\n"
+        f"- Class Name: {class_name}\n"
+        f"- Confidence: {confidence_score:.2f}%\n"
+        "Use this info along with the symptoms to form a diagnosis.\n"
+    )
+
+# Clients that send `parallel: true` (form or JSON field) get their photo
+# classified on this pool while the conversation history is loaded.
+classify_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CLASSIFY_WORKERS", "4")), thread_name_prefix="classify"
+)
+
+def timed_response(timer, body, status=200, headers=None):
+    response = jsonify(body)
+    response.status_code = status
+    response.headers.update(headers or {})
+    response.headers["Server-Timing"] = timer.header()
+    return response
+
+def diagnose(endpoint, require_message=False, require_image=False):
+    """Shared /chat and /classify pipeline; each stage's time is reported in a Server-Timing header."""
+    timer = StageTimer()
+    with timer.stage("parse"):
+        chat_request = ChatRequest(request)
+    print(chat_request.message)
+    if require_message and not chat_request.message_sent:
+        return timed_response(timer, {"error": "No message provided"}, 400)
+    if require_message and not chat_request.message:
+        return timed_response(timer, {"error": "Empty message provided"}, 400)
+    if require_image and chat_request.image is None:
+        return timed_response(timer, {"error": "No file provided"}, 400)
+    if chat_request.conversation_id and not conversation_store.exists(chat_request.conversation_id):
+        return timed_response(timer, {
+            "error": "Unknown or expired conversation_id; send conversation_id \"new\" to start a conversation"
+        }, 404)
+
+    classification = None
+    if chat_request.image is not None and chat_request.parallel:
+        classification = classify_executor.submit(timer.timed, "classify", classify_upload, chat_request.image)
+    with timer.stage("history"):
+        conversation_history = load_history(chat_request)
+    message = chat_request.message
+    if message and (not conversation_history or conversation_history[-1] != f"**User:** {message}"):
         conversation_history.append(f"**User:** {message}")
-    context = "\n".join(conversation_history)
-    image_diagnosis_info = ""
-    classification_result = None
-    confidence_score = None
-    class_name = None
-    if 'file' in request.files:
+    conversation_id = chat_request.conversation_id
+    if chat_request.new_conversation:
+        conversation_id = conversation_store.new_id()
+    personalized = len(list(filter(None, conversation_history))) > 1
+
+    class_id = class_name = confidence_score = None
+    if chat_request.image is not None:
         print("File detected in request")
         try:
-            classification_result, class_name, confidence_score = process_image(request.files['file'])
-            print(f"Image classified: class_id={classification_result}, class_name={class_name}, confidence={confidence_score:.2f}%")
-            if confidence_score >= 80:
-                image_diagnosis_info = (
-                    f"\n\nImage-based classification:\n"
-                    f"- Class ID: {classification_result}\n"
-                    f"- Class Name: {class_name}\n"
-                    f"- Confidence: {confidence_score:.2f}%\n"
-                    "Use this info along with the symptoms to form a diagnosis.\n"
-                )
+            if classification is None:
+                with timer.stage("classify"):
+                    class_id, class_name, confidence_score = classify_upload(chat_request.image)
+            else:
+                class_id, class_name, confidence_score = classification.result()
+            print(f"Image classified: class_id={class_id}, class_name={class_name}, confidence={confidence_score:.2f}%")
+        except ModelNotReady as e:
+            return timed_response(timer, {"error": str(e)}, 503)
         except Exception as e:
-            return jsonify({"error": f"Image processing error: {str(e)}"}), 500
+            return timed_response(timer, {"error": f"Image processing error: {str(e)}"}, 500)
+    context = "\n".join(filter(None, conversation_history))
+    image_classification = {"class_id": class_id, "class_name": class_name, "confidence": confidence_score}
+    image_diagnosis_info = image_prompt_info(class_id, class_name, confidence_score)
     prompt = (
         "Analyze the following patient conversation and diagnosis input (including any image classification). "
         "Provide a structured Markdown-formatted diagnosis with medicines and confidence score.\n\n"
         f"{context}{image_diagnosis_info}"
     )
+    cache_key = None if personalized or not message else (message, class_id if image_diagnosis_info else None)
+    user_turn = user_turn_text(message, class_name, confidence_score)
+    if chat_request.stream_format:
+        response = stream_records(stream_diagnosis(prompt, image_classification, conversation_id, user_turn,
+                                                   cache_key, timer), chat_request.stream_format)
+        response.headers["Server-Timing"] = timer.header()
+        return response
+
+    with timer.stage("cache"):
+        output, cache_state = cached_response(cache_key)
     try:
-        response_gen = assistant.chat(prompt)
-        output = "".join(response_gen).strip()
-        print("Assistant response generated.")
+        if output is None:
+            with timer.stage("llm"):
+                output = "".join(build_assistant().chat(prompt)).strip()
+            store_response(cache_key, output)
+        print(f"Assistant response generated from {endpoint}.")
     except Exception as e:
         print("Error during assistant.chat:", e)
-        return jsonify({"error": str(e)}), 500
-    confidence_match = re.search(r"Confidence:\s*(\d+)%", output)
-    diagnosis_confidence = int(confidence_match.group(1)) if confidence_match else None
-    formatted_output = f"**Diagnosis**\n\n{output}"
-    return jsonify({
-        "response": formatted_output,
-        "confidence": diagnosis_confidence,
-        "image_classification": {
-            "class_id": classification_result,
-            "class_name": class_name,
-            "confidence": confidence_score
-        }
-    })
+        return timed_response(timer, {"error": str(e)}, 500)
+    confidence_match = CONFIDENCE_RE.search(output)
+    with timer.stage("store"):
+        record_turns(conversation_id, user_turn, output)
+    return timed_response(timer, {
+        "conversation_id": conversation_id,
+        "cache": cache_state,
+        "response": f"**Diagnosis**\n\n{output}",
+        "confidence": int(confidence_match.group(1)) if confidence_match else None,
+        "image_classification": image_classification
+    }, headers={"X-Cache": cache_state})
+
+@app.route('/')
+def home():
+    return "Welcome to the Diagnosis API. Please POST your data to /chat or /classify."
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    print("📨 Received request to /chat")
+    return diagnose("/chat", require_message=True)
 
 @app.route('/classify', methods=['POST'])
 def classify_endpoint():
     print("📨 Received request to /classify")
-    message = request.form.get("message") or (request.json.get("message") if request.is_json else "")
-    message = message.strip() if message else ""
-    user_history = request.form.get("history")
-    conversation_history = []
-    if user_history:
+    return diagnose("/classify", require_image=True)
+
+# /ready checks that Groq accepts our key at most every ASSISTANT_CHECK_SECONDS;
+# replayed responses need no Groq at all.
+ASSISTANT_CHECK_SECONDS = float(os.getenv("ASSISTANT_CHECK_SECONDS", "60"))
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"
+assistant_check = LRUCache(max_entries=1, ttl=ASSISTANT_CHECK_SECONDS)
+
+def check_assistant():
+    """Readiness of the text assistant's LLM backend, probed at most once per ASSISTANT_CHECK_SECONDS"""
+    if llm_backend and llm_backend.mode == "replay":
+        return {"state": "ready", "llm": "replay"}
+    status = assistant_check.get("groq")
+    if status is None:
         try:
-            history_list = json.loads(user_history)
-            if isinstance(history_list, list):
-                conversation_history = [f"**User:** {msg.get('content', '').strip()}" for msg in history_list if msg.get('content')]
-        except Exception as e:
-            print("History parsing error:", e)
-    if message :
-        conversation_history.append(f"**User:** {message}")
-    context = "\n".join(conversation_history)
-    if 'file' not in request.files:
-        return jsonify({"error": "No file provided"}), 400
-    try:
-        classification_result, class_name, confidence_score = process_image(request.files['file'])
-        print(f"Image classified: class_id={classification_result}, class_name={class_name}, confidence={confidence_score:.2f}%")
-    except Exception as e:
-        return jsonify({"error": f"Image processing error: {str(e)}"}), 500
-    image_diagnosis_info = ""
-    if confidence_score >= 80:
-        image_diagnosis_info = (
-            f"\n\nImage-based classification:\n"
-            f"- Class ID: {classification_result}\n"
-            f"- Class Name: {class_name}\n"
-            f"- Confidence: {confidence_score:.2f}%\n"
-            "Use this info along with the symptoms to form a diagnosis.\n"
-        )
-    else:
-        image_diagnosis_info = ""
-    prompt = (
-        "Analyze the following patient conversation and diagnosis input (including any image classification). "
-        "Provide a structured Markdown-formatted diagnosis with medicines and confidence score.\n\n"
-        f"{context}{image_diagnosis_info}"
-    )
-    try:
-        response_gen = assistant.chat(prompt)
-        output = "".join(response_gen).strip()
-        print("Assistant response generated from /classify.")
-    except Exception as e:
-        print("Error during assistant.chat:", e)
-        return jsonify({"error": str(e)}), 500
-    confidence_match = re.search(r"Confidence:\s*(\d+)%", output)
-    diagnosis_confidence = int(confidence_match.group(1)) if confidence_match else None
-    formatted_output = f"**Diagnosis**\n\n{output}"
+            response = requests.get(GROQ_MODELS_URL, headers={"Authorization": f"Bearer {groq_api_key}"}, timeout=3)
+            if response.status_code == 200:
+                status = {"state": "ready", "llm": "groq"}
+            else:
+                status = {"state": "failed", "llm": "groq", "error": f"Groq returned HTTP {response.status_code}"}
+        except requests.exceptions.RequestException as e:
+            status = {"state": "failed", "llm": "groq", "error": f"Groq unreachable: {e}"}
+        status["checked_at"] = time.time()
+        assistant_check.set("groq", status)
+    return status
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """200 once text chat can be served; a loading or failed skin model only degrades it.
+
+    ?strict=1 also requires the skin model, for callers that need image classification.
+    """
+    components = {
+        "api": {"state": "ready"},
+        "assistant": check_assistant(),
+        "skin_model": skin_classifier.status(),
+    }
+    text_chat = components["assistant"]["state"] == "ready"
+    image_classification = components["skin_model"]["state"] == "ready"
+    serving = text_chat and (image_classification or request.args.get("strict") not in TRUTHY)
+    return jsonify({
+        "ready": serving,
+        "degraded": text_chat and not image_classification,
+        "text_chat": text_chat,
+        "image_classification": image_classification,
+        "components": components
+    }), 200 if serving else 503
+
+@app.route('/stats', methods=['GET'])
+def stats():
     return jsonify({
-        "response": formatted_output,
-        "confidence": diagnosis_confidence,
-        "image_classification": {
-            "class_id": classification_result,
-            "class_name": class_name,
-            "confidence": confidence_score
-        }
+        "skin_model": skin_classifier.stats(),
+        "classification_cache": classification_cache.stats(),
+        "classification_singleflight": classification_flight.stats(),
+        "conversations": conversation_store.stats(),
+        "response_cache": response_cache.stats(),
+        "llm_replay": llm_backend.stats() if llm_backend else None
     })
 
 if __name__ == '__main__':
@@ -0,0 +1,55 @@
+import contextvars
+import functools
+import time
+from contextlib import contextmanager
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+@contextmanager
+def latency_budget(seconds):
+    """Run the block with a latency budget; nested budgets can only shrink it."""
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires_at = min(expires_at, current)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_budget():
+    """Run the block without the caller's budget, for calls that must not be cut off midway."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_latency_budget(seconds):
+    """Decorate a Flask view so every outbound call it makes shares one budget."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with latency_budget(seconds):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def remaining():
+    """Seconds left in the current budget, or None when no budget is set."""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return max(expires_at - time.monotonic(), 0.0)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the caller's budget into the worker thread."""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
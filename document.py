@@ -13,6 +13,7 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from crewai import Agent, Task, Crew, LLM
 from dotenv import load_dotenv
+from llm_replay import crew_llm, llm_backend_from_env
 
 
 
@@ -22,16 +23,24 @@ logger = logging.getLogger(__name__)
 os.environ["LANGCHAIN_TRACING_V2"] = "false"
 app = Flask(__name__)
 CORS(app, resources={r"/diagnosis": {"origins": "http://localhost:3000"}})
+# LLM_MODE=record saves every Groq response; LLM_MODE=replay serves recorded
+# responses with synthetic latency and never calls Groq (no key needed).
+llm_backend = llm_backend_from_env("document")
 groq_api_key = os.getenv("GROQ_API_KEY")
-if not groq_api_key:
+if not groq_api_key and not (llm_backend and llm_backend.mode == "replay"):
     logger.error("GROQ_API_KEY environment variable not set")
     raise ValueError("GROQ_API_KEY is required")
-llm = LLM(
-    model="groq/llama-3.3-70b-versatile",
-    api_key=groq_api_key,
-    temperature=0.5,
-    max_completion_tokens=1500
-)
+if llm_backend and llm_backend.mode == "replay":
+    llm = crew_llm(llm_backend)
+else:
+    llm = LLM(
+        model="groq/llama-3.3-70b-versatile",
+        api_key=groq_api_key,
+        temperature=0.5,
+        max_completion_tokens=1500
+    )
+    if llm_backend:
+        llm = crew_llm(llm_backend, llm)
 nlp = spacy.load("en_core_web_sm")
 
 class DocumentProcessor:
@@ -0,0 +1,268 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import deadline as request_deadline
+from quota import QuotaWaitTimeout, get_quota_scheduler
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+HEDGE_MIN_SAMPLES = 20
+
+
+class EndpointMetrics:
+    """Request counters and a rolling latency window for one upstream endpoint (host and path)."""
+
+    def __init__(self, window=512):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedge_saved = 0.0
+        self.latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+            else:
+                self.latencies.append(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedges += 1
+
+    def record_hedge_win(self, saved):
+        with self._lock:
+            self.hedge_wins += 1
+            self.hedge_saved += saved
+
+    def sample_count(self):
+        return len(self.latencies)
+
+    def percentile(self, q):
+        """Latency (seconds) at quantile q over the rolling window, or None without samples."""
+        with self._lock:
+            return _percentile(sorted(self.latencies), q)
+
+    def snapshot(self):
+        with self._lock:
+            samples = sorted(self.latencies)
+            snapshot = {'requests': self.requests, 'errors': self.errors, 'retries': self.retries,
+                        'hedges': self.hedges, 'hedge_wins': self.hedge_wins,
+                        'hedge_saved_ms': round(self.hedge_saved * 1000, 1)}
+        for name, q in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0)):
+            value = _percentile(samples, q)
+            snapshot[name] = round(value * 1000, 1) if value is not None else None
+        return snapshot
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class HttpClient:
+    """Outbound HTTP client shared by the services.
+
+    Keeps one keep-alive connection pool per upstream host, applies a per-call
+    timeout capped by an optional total deadline, retries 429/5xx responses and
+    Google's OVER_QUERY_LIMIT status with jittered exponential backoff, and
+    records latency per endpoint (host and path), so slow photo downloads do
+    not skew the numbers for details lookups on the same host. Only idempotent methods are retried on network
+    errors; POSTs are sent once unless the caller asks for retries. Calls made
+    with a `priority` first take a token from the quota scheduler.
+
+    Every call is also capped by the latency budget of the request that made
+    it (see deadline.py). GETs made with `hedge=True` that are still pending
+    after their endpoint's p95 latency get a duplicate request (if a quota token is
+    immediately available); whichever answers first is used.
+    """
+
+    def __init__(self, timeout=(3.05, 10), max_retries=2, backoff=0.25, pool_size=20,
+                 scheduler=None, max_quota_wait=10.0):
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.max_quota_wait = max_quota_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size * 2, thread_name_prefix="http-hedge")
+
+    def _host(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _endpoint(self, url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{parts.path}"
+
+    def session(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def metrics(self, endpoint):
+        with self._lock:
+            metrics = self._metrics.get(endpoint)
+            if metrics is None:
+                metrics = self._metrics[endpoint] = EndpointMetrics()
+            return metrics
+
+    @staticmethod
+    def _should_retry(response):
+        if response.status_code in RETRY_STATUS_CODES:
+            return True
+        return b'"OVER_QUERY_LIMIT"' in response.content[:512]
+
+    def _acquire_quota(self, priority, expires_at, host):
+        wait = self.max_quota_wait
+        if expires_at is not None:
+            wait = min(wait, max(expires_at - time.monotonic(), 0))
+        try:
+            self.scheduler.acquire(priority, timeout=wait)
+        except QuotaWaitTimeout as e:
+            raise requests.exceptions.Timeout(f"Quota wait for {host} timed out: {e}")
+
+    def _send(self, session, metrics, method, url, timeout, kwargs):
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except Exception:
+            metrics.record(time.perf_counter() - start, error=True)
+            raise
+        metrics.record(time.perf_counter() - start)
+        return response
+
+    def _send_hedged(self, session, metrics, method, url, timeout, kwargs, priority):
+        """Send, firing a duplicate if the first attempt outlives the endpoint's p95."""
+        delay = metrics.percentile(0.95)
+        if delay is None or metrics.sample_count() < HEDGE_MIN_SAMPLES:
+            return self._send(session, metrics, method, url, timeout, kwargs)
+
+        primary = self._hedge_pool.submit(self._send, session, metrics, method, url, timeout, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if priority is not None and self.scheduler is not None:
+            try:
+                self.scheduler.acquire(priority, timeout=0)
+            except QuotaWaitTimeout:
+                return primary.result()
+
+        metrics.record_hedge()
+        hedge = self._hedge_pool.submit(self._send, session, metrics, method, url, timeout, kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None and pending:
+                    continue
+                if future is hedge and not primary.done():
+                    won_at = time.monotonic()
+                    primary.add_done_callback(lambda f: metrics.record_hedge_win(time.monotonic() - won_at))
+                return future.result()
+
+    def request(self, method, url, timeout=None, deadline=None, retries=None, priority=None, hedge=False, **kwargs):
+        """Send a request; `deadline` is a total budget in seconds across all attempts."""
+        host = self._host(url)
+        session = self.session(host)
+        metrics = self.metrics(self._endpoint(url))
+        if retries is None:
+            retries = self.max_retries if method.upper() in ("GET", "HEAD") else 0
+        timeout = self.timeout if timeout is None else timeout
+        budget = request_deadline.remaining()
+        if budget is not None:
+            deadline = budget if deadline is None else min(deadline, budget)
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        hedge = hedge and method.upper() == "GET"
+
+        attempt = 0
+        while True:
+            call_timeout = timeout
+            if expires_at is not None:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    raise requests.exceptions.Timeout(f"Deadline exceeded before calling {host}")
+                call_timeout = (tuple(min(t, remaining) for t in timeout) if isinstance(timeout, tuple)
+                                else min(timeout, remaining))
+
+            if priority is not None and self.scheduler is not None:
+                self._acquire_quota(priority, expires_at, host)
+
+            try:
+                if hedge:
+                    response = self._send_hedged(session, metrics, method, url, call_timeout, kwargs, priority)
+                else:
+                    response = self._send(session, metrics, method, url, call_timeout, kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= retries:
+                    raise
+                logger.warning(f"{method} {host} failed ({e.__class__.__name__}), retrying")
+            else:
+                if attempt >= retries or not self._should_retry(response):
+                    return response
+                logger.warning(f"{method} {host} returned a retryable response ({response.status_code}), retrying")
+
+            attempt += 1
+            metrics.record_retry()
+            sleep = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            if expires_at is not None:
+                sleep = min(sleep, max(expires_at - time.monotonic(), 0))
+            time.sleep(sleep)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            endpoints = dict(self._metrics)
+        return {endpoint: metrics.snapshot() for endpoint, metrics in endpoints.items()}
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Process-wide HTTP client, configured from HTTP_CONNECT_TIMEOUT / HTTP_READ_TIMEOUT / HTTP_RETRIES."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = HttpClient(
+                timeout=(float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")), float(os.getenv("HTTP_READ_TIMEOUT", "10"))),
+                max_retries=int(os.getenv("HTTP_RETRIES", "2")),
+                backoff=float(os.getenv("HTTP_RETRY_BACKOFF", "0.25")),
+                pool_size=int(os.getenv("HTTP_POOL_SIZE", "20")),
+                scheduler=get_quota_scheduler(),
+                max_quota_wait=float(os.getenv("GOOGLE_QUOTA_MAX_WAIT", "10")),
+            )
+        return _http_client
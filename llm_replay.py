@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LLM_MODES = ('live', 'record', 'replay')
+CHUNK_RE = re.compile(r"\S+\s*|\s+")
+
+FALLBACK_RESPONSE = (
+    "Based on the described symptoms this is most likely a mild viral infection. "
+    "Rest, fluids and paracetamol for fever are usually enough.\n\n"
+    "Confidence: 70%\n\nSUMMARY: Likely mild viral infection, rest and hydrate\n"
+)
+
+
+class ReplayMiss(LookupError):
+    """No recorded response for this prompt and the backend is configured to fail on misses."""
+
+
+def prompt_key(messages):
+    """Stable key for a conversation: role and whitespace-normalized content of every message."""
+    canonical = [(m.get('role'), " ".join(str(m.get('content') or '').split())) for m in messages]
+    return hashlib.sha256(json.dumps(canonical, ensure_ascii=False).encode()).hexdigest()
+
+
+class ReplayStore:
+    """Recorded LLM responses in an append-only JSONL file, keyed by prompt_key."""
+
+    def __init__(self, path):
+        self.path = path
+        self._responses = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self._responses[record['key']] = record['response']
+        self._keys = sorted(self._responses)
+
+    def get(self, key):
+        return self._responses.get(key)
+
+    def any(self, key):
+        """A recorded response picked deterministically from the key, or None if nothing is recorded."""
+        if not self._keys:
+            return None
+        return self._responses[self._keys[int(key[:8], 16) % len(self._keys)]]
+
+    def record(self, key, messages, response):
+        with self._lock:
+            if key not in self._responses:
+                self._keys.append(key)
+            self._responses[key] = response
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'messages': messages, 'response': response}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._responses)
+
+
+class ReplayBackend:
+    """Record real LLM responses, or replay them with synthetic timing.
+
+    In `record` mode every call goes to the live LLM and the response is
+    appended to the store. In `replay` mode no network call is made: the
+    recorded response for the same prompt is returned after `ttft` seconds
+    and streamed at `tokens_per_s` (about four characters per token). A
+    prompt that was never recorded gets some other recorded response when
+    `on_miss` is 'synthetic', or raises ReplayMiss when it is 'error'.
+    """
+
+    def __init__(self, mode, store, ttft=0.3, tokens_per_s=80.0, on_miss='synthetic'):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"ReplayBackend mode must be 'record' or 'replay', not {mode!r}")
+        self.mode = mode
+        self.store = store
+        self.ttft = ttft
+        self.tokens_per_s = tokens_per_s
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    def _lookup(self, key):
+        response = self.store.get(key)
+        with self._lock:
+            if response is not None:
+                self.hits += 1
+                return response
+            self.misses += 1
+        if self.on_miss == 'error':
+            raise ReplayMiss(f"No recorded response for prompt {key[:12]}")
+        return self.store.any(key) or FALLBACK_RESPONSE
+
+    def _record(self, key, messages, response):
+        self.store.record(key, messages, response)
+        with self._lock:
+            self.recorded += 1
+
+    def _chunks(self, response):
+        time.sleep(self.ttft)
+        for chunk in CHUNK_RE.findall(response):
+            if self.tokens_per_s:
+                time.sleep(len(chunk) / 4 / self.tokens_per_s)
+            yield chunk
+
+    def complete(self, messages, live=None):
+        """Full response text; `live()` produces the real one in record mode."""
+        key = prompt_key(messages)
+        if self.mode == 'record':
+            response = live()
+            self._record(key, messages, response)
+            return response
+        return "".join(self._chunks(self._lookup(key)))
+
+    def stream(self, messages, live_stream=None):
+        """Response chunks; `live_stream()` yields the real ones in record mode."""
+        key = prompt_key(messages)
+        if self.mode == 'record':
+            chunks = []
+            for chunk in live_stream():
+                chunks.append(chunk)
+                yield chunk
+            self._record(key, messages, "".join(chunks))
+            return
+        yield from self._chunks(self._lookup(key))
+
+    def stats(self):
+        return {
+            'mode': self.mode,
+            'recordings': len(self.store),
+            'hits': self.hits,
+            'misses': self.misses,
+            'recorded': self.recorded,
+            'ttft_ms': round(self.ttft * 1000, 1),
+            'tokens_per_s': self.tokens_per_s,
+        }
+
+
+def llm_backend_from_env(service):
+    """ReplayBackend configured from LLM_MODE / LLM_RECORDINGS / LLM_REPLAY_*, or None in live mode."""
+    mode = os.getenv("LLM_MODE", "live").lower()
+    if mode not in LLM_MODES:
+        raise ValueError(f"LLM_MODE must be one of {', '.join(LLM_MODES)}")
+    if mode == 'live':
+        return None
+    path = os.getenv("LLM_RECORDINGS", os.path.join("recordings", f"{service}.jsonl"))
+    backend = ReplayBackend(
+        mode,
+        ReplayStore(path),
+        ttft=float(os.getenv("LLM_REPLAY_TTFT_MS", "300")) / 1000,
+        tokens_per_s=float(os.getenv("LLM_REPLAY_TOKENS_PER_S", "80")),
+        on_miss=os.getenv("LLM_REPLAY_MISS", "synthetic"),
+    )
+    logger.info(f"LLM {mode} mode for {service} using {path} ({len(backend.store)} recordings)")
+    return backend
+
+
+def _message_dicts(messages):
+    if isinstance(messages, str):
+        return [{'role': 'user', 'content': messages}]
+    return [m if isinstance(m, dict) else {'role': m.role, 'content': m.content} for m in messages]
+
+
+_adapters = {}
+
+
+def assistant_llm(backend, inner=None):
+    """A phi LLM for chatbot.py's Assistant that records through, or replays from, `backend`."""
+    if 'phi' not in _adapters:
+        from typing import Any, Optional
+
+        from phi.llm.base import LLM
+
+        class ReplayAssistantLLM(LLM):
+            model: str = "replay"
+            backend: Any = None
+            inner: Optional[LLM] = None
+
+            def _sync_tools(self):
+                # The Assistant registers its tools on this LLM; the live one needs them to record tool use.
+                self.inner.tools, self.inner.functions = self.tools, self.functions
+
+            def response(self, messages):
+                live = None
+                if self.inner is not None:
+                    self._sync_tools()
+                    live = lambda: self.inner.response(messages)
+                return self.backend.complete(_message_dicts(messages), live)
+
+            def response_stream(self, messages):
+                live_stream = None
+                if self.inner is not None:
+                    self._sync_tools()
+                    live_stream = lambda: self.inner.response_stream(messages)
+                return self.backend.stream(_message_dicts(messages), live_stream)
+
+        _adapters['phi'] = ReplayAssistantLLM
+    return _adapters['phi'](model=getattr(inner, 'model', 'replay'), backend=backend, inner=inner)
+
+
+def crew_llm(backend, inner=None):
+    """A crewai LLM for document.py's agents that records through, or replays from, `backend`."""
+    if 'crewai' not in _adapters:
+        from crewai import BaseLLM
+
+        class ReplayCrewLLM(BaseLLM):
+            def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+                inner = self.__dict__['_replay_inner']
+                live = None
+                if inner is not None:
+                    live = lambda: inner.call(messages, tools=tools, callbacks=callbacks,
+                                              available_functions=available_functions, **kwargs)
+                return self.__dict__['_replay_backend'].complete(_message_dicts(messages), live)
+
+            def supports_function_calling(self):
+                return False
+
+            def supports_stop_words(self):
+                return False
+
+            def get_context_window_size(self):
+                return 8192
+
+        _adapters['crewai'] = ReplayCrewLLM
+    llm = _adapters['crewai'](model=getattr(inner, 'model', 'replay'))
+    # crewai LLMs are pydantic models in recent releases; keep our state out of their fields.
+    llm.__dict__['_replay_backend'] = backend
+    llm.__dict__['_replay_inner'] = inner
+    return llm
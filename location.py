@@ -1,83 +1,128 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 import requests
 import os
 from flask_cors import CORS
 from dotenv import load_dotenv
 import time
-import math
+import itertools
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
+from http_client import get_http_client
+from cache import StaleWhileRevalidateCache, get_place_cache
+from streaming import requested_stream_format, stream_records
+from pagination import CursorExpiredError, PagePrefetcher
+from singleflight import SingleFlight
+from ranking import RankingEngine, haversine_km
+from photo_cache import PHOTO_FORMATS, PhotoCache
+from quota import BACKGROUND, SEARCH, get_quota_scheduler
+import deadline as request_deadline
+import numpy as np
 
 load_dotenv(".env.local")
 app = Flask(__name__)
 CORS(app)
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+GOOGLE_MAPS_BASE_URL = os.getenv("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com/maps/api")
+PLACE_DETAILS_FIELDS = ("formatted_phone_number", "website", "opening_hours", "price_level", "reviews")
+place_cache = get_place_cache()
+http_client = get_http_client()
+# Each prefetch worker spends ~2 s per page waiting out Google's page-token
+# delay, so one worker drains at most one search every ~4 s; size the pool
+# for the expected rate of paginated searches.
+page_prefetcher = PagePrefetcher(ttl=int(os.getenv("PAGE_CURSOR_TTL", "600")),
+                                 max_workers=int(os.getenv("PAGE_PREFETCH_WORKERS", "16")))
 
-def calculate_distance(lat1, lng1, lat2, lng2):
-    """Calculate distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lng = math.radians(lng2 - lng1)
-    
-    a = (math.sin(delta_lat / 2) ** 2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * 
-         math.sin(delta_lng / 2) ** 2)
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
-
-def get_place_details(place_id):
-    """Get detailed information about a place"""
-    try:
-        details_url = (
-            f"https://maps.googleapis.com/maps/api/place/details/json"
-            f"?place_id={place_id}"
-            f"&fields=formatted_phone_number,website,opening_hours,price_level,reviews"
-            f"&key={GOOGLE_MAPS_API_KEY}"
-        )
-        response = requests.get(details_url)
-        result = response.json()
-        
-        if result.get("status") == "OK":
-            return result.get("result", {})
-        return {}
-    except:
-        return {}
-
-def sort_doctors(doctors, sort_by, user_lat=None, user_lng=None):
-    """Sort doctors based on the specified criteria"""
-    if sort_by == "rating":
-        # Sort by open status first, then by rating
-        return sorted(doctors, key=lambda x: (
-            not x.get('open_now', False),  # Open places first
-            -(x.get('rating') or 0)        # Higher rating first
-        ))
-    elif sort_by == "distance" and user_lat and user_lng:
-        # Sort by distance from user
-        for doctor in doctors:
-            if doctor.get('location'):
-                doctor['distance'] = calculate_distance(
-                    user_lat, user_lng,
-                    doctor['location']['lat'],
-                    doctor['location']['lng']
-                )
-            else:
-                doctor['distance'] = float('inf')
-        return sorted(doctors, key=lambda x: x.get('distance', float('inf')))
-    elif sort_by == "open":
-        # Sort by open status, then by rating
-        return sorted(doctors, key=lambda x: (
-            not x.get('open_now', False),
-            -(x.get('rating') or 0)
-        ))
-    else:
-        # Default sorting (rating)
-        return sorted(doctors, key=lambda x: (
-            not x.get('open_now', False),
-            -(x.get('rating') or 0)
-        ))
+# Full searches are cached without per-user distances, keyed by normalized text
+# or a ~1 km lat/lng cell; stale entries are served while one refresh runs.
+SEARCH_RADIUS_M = 25000
+MAX_SEARCH_RADIUS_M = 50000  # Places Nearby Search maximum
+MAX_SEARCH_RESULTS = 60
+SEARCH_CACHE_CELL_DEG = float(os.getenv("SEARCH_CACHE_CELL_DEG", "0.01"))
+search_cache = StaleWhileRevalidateCache(
+    fresh_ttl=float(os.getenv("SEARCH_CACHE_FRESH_TTL", "600")),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", "3600")),
+    max_entries=int(os.getenv("SEARCH_CACHE_SIZE", "512")),
+    max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    sizeof=lambda search: len(json.dumps(search)),
+    # A partial search never overwrites a complete one
+    replaces=lambda old, new: new['complete'] or not old['complete']
+)
+search_flight = SingleFlight()
+
+# Latency budgets shared by every Google call an endpoint makes
+SEARCH_LATENCY_BUDGET = float(os.getenv("DOCTOR_SEARCH_LATENCY_BUDGET", "20"))
+DETAILS_LATENCY_BUDGET = float(os.getenv("DOCTOR_DETAILS_LATENCY_BUDGET", "5"))
+HEDGE_DETAILS_CALLS = os.getenv("DOCTOR_DETAILS_HEDGE", "1") not in ("0", "false", "no")
+
+# Batch details: uncached place_ids are fetched concurrently under a cap
+DETAILS_BATCH_MAX_IDS = int(os.getenv("DETAILS_BATCH_MAX_IDS", "100"))
+DETAILS_BATCH_TIMEOUT = float(os.getenv("DETAILS_BATCH_TIMEOUT", "10"))
+details_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DETAILS_BATCH_WORKERS", "8")),
+    thread_name_prefix="doctor-details"
+)
+
+# Photos are proxied so the API key never reaches clients; each one is fetched
+# from Google once and served from resized on-disk thumbnails afterwards.
+# Photo links point at the host each request came in on, unless PHOTO_BASE_URL
+# names another origin (e.g. a CDN in front of /photo).
+PHOTO_BASE_URL = (os.getenv("PHOTO_BASE_URL") or "").rstrip('/')
+PHOTO_MAX_AGE = int(os.getenv("PHOTO_MAX_AGE", str(7 * 86400)))
+PHOTO_REFERENCE_RE = re.compile(r'^[A-Za-z0-9_-]{1,2048}$')
+photo_cache = PhotoCache(
+    os.getenv("PHOTO_CACHE_DIR", "photo_cache"),
+    max_bytes=int(os.getenv("PHOTO_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+)
+photo_flight = SingleFlight()
+
+# Details statuses that mean the place itself is unknown, not that the lookup failed
+PLACE_NOT_FOUND_STATUSES = ("NOT_FOUND", "ZERO_RESULTS", "INVALID_REQUEST")
+
+def fetch_place_details(place_id):
+    """Fetch place details from Google; None when Google does not know the place
+
+    Network errors and other Places statuses (quota, denied, unknown error)
+    are raised, so callers can tell a failed lookup from a missing place.
+    """
+    details_url = (
+        f"{GOOGLE_MAPS_BASE_URL}/place/details/json"
+        f"?place_id={place_id}"
+        f"&fields={','.join(PLACE_DETAILS_FIELDS)}"
+        f"&key={GOOGLE_MAPS_API_KEY}"
+    )
+    response = http_client.get(details_url, priority=BACKGROUND, hedge=HEDGE_DETAILS_CALLS)
+    result = response.json()
+
+    if result.get("status") == "OK":
+        return result.get("result", {})
+    if result.get("status") in PLACE_NOT_FOUND_STATUSES:
+        return None
+    raise PlacesAPIError(result)
+
+def get_place_details(place_id, source=None):
+    """Get detailed information about a place
+
+    When a source dict is given, source['cached'] says whether the details
+    were served from the cache rather than by a Google fetch (this call's own
+    or one it shared with a concurrent request).
+    """
+    details = place_cache.get_or_fetch(place_id, PLACE_DETAILS_FIELDS, lambda: fetch_place_details(place_id),
+                                       source=source)
+    return details or {}
+
+def sort_doctors(doctors, sort_by, user_lat=None, user_lng=None, k=None, weights=None):
+    """Sort doctors based on the specified criteria, keeping only the top k if given"""
+    # "rating", "open" and unknown values: open places first, then higher rating.
+    # "distance": nearest first (needs the user's location).
+    # "score": weighted distance, rating, review count and open_now.
+    engine = RankingEngine(doctors)
+    order, distances = engine.rank(sort_by, user_lat, user_lng, k=k, weights=weights)
+    if distances is not None:
+        for doctor, distance in zip(doctors, distances.tolist()):
+            doctor['distance'] = distance
+    return [doctors[i] for i in order.tolist()]
 
 @app.route('/')
 def home():
@@ -86,7 +131,10 @@ def home():
         "version": "2.0",
         "endpoints": {
             "/nearby-doctors": "POST - Find doctors near a location",
-            "/specializations": "GET - Get list of available specializations"
+            "/doctor-details/batch": "POST - Get details for a list of place_ids",
+            "/photo/<photo_reference>": "GET - Resized, cacheable place photo",
+            "/specializations": "GET - Get list of available specializations",
+            "/stats": "GET - Cache statistics"
         }
     })
 
@@ -117,153 +165,314 @@ def get_specializations():
     ]
     return jsonify({"specializations": specializations})
 
+MAX_PAGES = 3  # Google Places API allows up to 3 pages
+PLACES_PAGE_SIZE = 20
+PAGE_TOKEN_DELAY = 2  # Google requires a delay before using the next page token
+
+class PlacesAPIError(Exception):
+    """Google Places returned a status other than OK/ZERO_RESULTS"""
+    def __init__(self, result):
+        super().__init__(result.get("status"))
+        self.result = result
+
+def build_doctor_search_url(lat, lng, text, specialisation, radius=SEARCH_RADIUS_M):
+    """Build the Places search URL, or None when no location was given"""
+    if text:
+        # Text-based search
+        if specialisation:
+            # Clean specialisation for URL
+            clean_spec = specialisation.replace(' ', '+').lower()
+            query = f"{clean_spec}+doctor+in+{text.replace(' ', '+')}"
+        else:
+            query = f"doctors+hospitals+medical+in+{text.replace(' ', '+')}"
+        
+        return (
+            f"{GOOGLE_MAPS_BASE_URL}/place/textsearch/json"
+            f"?query={query}"
+            f"&type=doctor"
+            f"&key={GOOGLE_MAPS_API_KEY}"
+        )
+    elif lat is not None and lng is not None:
+        # Location-based search
+        if specialisation:
+            # Use keyword for specialisation
+            clean_spec = specialisation.replace(' ', '+').lower()
+            return (
+                f"{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json"
+                f"?location={lat},{lng}"
+                f"&radius={radius}"  # Defaults to 25km
+                f"&type=doctor"
+                f"&keyword={clean_spec}"
+                f"&key={GOOGLE_MAPS_API_KEY}"
+            )
+        return (
+            f"{GOOGLE_MAPS_BASE_URL}/place/nearbysearch/json"
+            f"?location={lat},{lng}"
+            f"&radius={radius}"
+            f"&type=doctor"
+            f"&key={GOOGLE_MAPS_API_KEY}"
+        )
+    return None
+
+def build_doctor_info(place):
+    """Convert a Places search result into a doctor record"""
+    # Extract basic information
+    doctor_info = {
+        'id': place.get('place_id'),
+        'name': place.get('name'),
+        'address': place.get('vicinity') or place.get('formatted_address'),
+        'location': place.get('geometry', {}).get('location'),
+        'rating': place.get('rating'),
+        'user_ratings_total': place.get('user_ratings_total', 0),
+        'price_level': place.get('price_level'),
+        'open_now': place.get('opening_hours', {}).get('open_now'),
+        'types': place.get('types', []),
+        'photos': place.get('photos', [])[:1] if place.get('photos') else []  # Get first photo only
+    }
+    return doctor_info
+
+def photo_base_url():
+    """Origin for photo links: PHOTO_BASE_URL when set, else the host this request came in on"""
+    return PHOTO_BASE_URL or request.host_url.rstrip('/')
+
+def with_photo_url(doctor, base_url):
+    """Copy of a doctor record with an absolute photo_url for this response
+
+    Records are cached and shared between requests, so the URL is only added
+    to the copy that goes out.
+    """
+    doctor = dict(doctor)
+    photos = doctor.get('photos') or []
+    photo_reference = photos[0].get('photo_reference') if photos else None
+    if photo_reference:
+        doctor['photo_url'] = f"{base_url}/photo/{photo_reference}?w=400"
+    return doctor
+
+def fetch_doctor_pages(url, lat=None, lng=None, max_results=60, progress=None):
+    """Yield the doctors of each Google results page, up to max_results in total
+
+    When a progress dict is given, progress['more'] says before each yield
+    whether another page will follow it.
+    """
+    found = 0
+    next_page_token = None
+    page_count = 0
+
+    while page_count < MAX_PAGES and found < max_results:
+        # Add page token if available
+        current_url = url + (f"&pagetoken={next_page_token}" if next_page_token else "")
+        
+        # Make the API request
+        response = http_client.get(current_url, priority=SEARCH)
+        result = response.json()
+
+        if result.get("status") not in ["OK", "ZERO_RESULTS"]:
+            raise PlacesAPIError(result)
+
+        page = add_distances([build_doctor_info(place) for place in result.get("results", [])[:max_results - found]],
+                             lat, lng)
+        found += len(page)
+
+        # Check for next page token
+        next_page_token = result.get("next_page_token")
+        page_count += 1
+        more = bool(next_page_token) and found < max_results and page_count < MAX_PAGES
+        if progress is not None:
+            progress['more'] = more
+        yield page
+
+        # Break if no more pages
+        if not more:
+            break
+
+        time.sleep(PAGE_TOKEN_DELAY)
+
+def summarize_doctors(doctors):
+    """Summary statistics for a list of doctors"""
+    open_now = with_ratings = 0
+    rating_sum = 0
+    for d in doctors:
+        if d.get('open_now'):
+            open_now += 1
+        if d.get('rating'):
+            with_ratings += 1
+            rating_sum += d['rating']
+    return {
+        'total_found': len(doctors),
+        'open_now': open_now,
+        'with_ratings': with_ratings,
+        'average_rating': round(rating_sum / max(with_ratings, 1), 2)
+    }
+
+def search_cache_key(lat, lng, text, specialisation, radius):
+    """Cache key: normalized text or quantized coordinates, plus specialisation and radius"""
+    spec = ' '.join((specialisation or '').lower().split())
+    if text:
+        return ('text', ' '.join(text.lower().split()), spec, radius)
+    return ('geo', round(float(lat) / SEARCH_CACHE_CELL_DEG), round(float(lng) / SEARCH_CACHE_CELL_DEG), spec, radius)
+
+def load_doctor_search(url, max_results=MAX_SEARCH_RESULTS):
+    """Fetch only the pages max_results needs, without user-specific distances
+
+    The result is marked complete once Google has no more results or
+    MAX_SEARCH_RESULTS were fetched; otherwise later pages may exist.
+    """
+    # Keep whole pages; the rest of a page costs nothing extra to fetch
+    limit = min(-(-max_results // PLACES_PAGE_SIZE) * PLACES_PAGE_SIZE, MAX_SEARCH_RESULTS)
+    doctors = []
+    for page in fetch_doctor_pages(url, max_results=limit):
+        doctors.extend(page)
+    return {'doctors': doctors, 'complete': len(doctors) < limit or len(doctors) >= MAX_SEARCH_RESULTS}
+
+def cached_doctor_search(key, url, max_results):
+    """(search, cache state) with at least max_results doctors when Google has them
+
+    A miss only fetches the pages this request needs; a partial search is
+    served and the remaining pages are filled in by a background refresh.
+    Background refreshes always load the full search.
+    """
+    load = lambda: search_flight.do((key, max_results), lambda: load_doctor_search(url, max_results))
+    search, cache_state = search_cache.get(key, load, refresh=lambda: load_doctor_search(url))
+    if not search['complete'] and len(search['doctors']) < max_results:
+        # A smaller search is cached; fetch the pages this one needs now
+        search, cache_state = load(), 'miss'
+        search_cache.set(key, search)
+    if not search['complete']:
+        search_cache.refresh(key, lambda: load_doctor_search(url))
+    return search, cache_state
+
+def bounded_int(value, default, low, high):
+    """value as an int clamped to [low, high]; default when absent; ValueError when not a number"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return max(low, min(int(float(value)), high))
+
+def add_distances(doctors, lat, lng):
+    """Set each doctor's distance from this user in one vectorized haversine pass; returns doctors"""
+    if not (lat and lng) or not doctors:
+        return doctors
+    located = [d for d in doctors if d.get('location')]
+    if located:
+        lats = np.array([d['location']['lat'] for d in located], dtype=float)
+        lngs = np.array([d['location']['lng'] for d in located], dtype=float)
+        for doctor, distance in zip(located, np.round(haversine_km(lats, lngs, lat, lng), 2).tolist()):
+            doctor['distance'] = distance
+    return doctors
+
+def with_distances(doctors, lat, lng):
+    """Copy cached doctors, adding the distance from this user"""
+    return add_distances([dict(doctor) for doctor in doctors], lat, lng)
+
+def places_error_response(error):
+    return jsonify({
+        'error': 'Google Places API error', 
+        'details': error.result,
+        'status': error.result.get("status")
+    }), 500
+
+def stream_doctors(first_page, pages, sort_by, lat, lng, max_results, search_params, weights=None, base_url=''):
+    """Emit doctors page by page as they arrive, then the sorted order and summary"""
+    doctors = []
+    try:
+        for page in itertools.chain([first_page], pages):
+            for doctor in page:
+                doctors.append(doctor)
+                yield {'type': 'doctor', 'doctor': with_photo_url(doctor, base_url)}
+    except PlacesAPIError as e:
+        yield {'type': 'error', 'error': 'Google Places API error', 'status': e.result.get("status")}
+    except requests.exceptions.RequestException as e:
+        yield {'type': 'error', 'error': 'Network error while fetching data', 'details': f'Request failed: {str(e)}'}
+
+    doctors = sort_doctors(doctors, sort_by, lat, lng, k=max_results, weights=weights)
+    yield {
+        'type': 'summary',
+        'summary': summarize_doctors(doctors),
+        'order': [d['id'] for d in doctors],
+        'search_params': search_params
+    }
+
+def doctor_page_response(page, cursor, context):
+    """Response for one cursor page; sorting applies within the page"""
+    doctors = sort_doctors(page, context['sort_by'], context['lat'], context['lng'], weights=context['weights'])
+    base_url = photo_base_url()
+    doctors = [with_photo_url(doctor, base_url) for doctor in doctors]
+    return jsonify({
+        'doctors': doctors,
+        'summary': summarize_doctors(doctors),
+        'search_params': context['search_params'],
+        'cursor': cursor
+    }), 200
+
 @app.route('/nearby-doctors', methods=['POST'])
+@request_deadline.with_latency_budget(SEARCH_LATENCY_BUDGET)
 def get_nearby_doctors():
     data = request.get_json() or {}
+    if data.get('cursor'):
+        return get_nearby_doctors_page(data['cursor'])
+
     lat = data.get('lat')
     lng = data.get('lng')
     text = data.get('text')
     specialisation = data.get('specialisation')
     sort_by = data.get('sort_by', 'rating')  # Default to rating
-    max_results = data.get('max_results', 60)  # Limit results
+    try:
+        max_results = bounded_int(data.get('max_results'), MAX_SEARCH_RESULTS, 1, MAX_SEARCH_RESULTS)  # Limit results
+        radius = bounded_int(data.get('radius'), SEARCH_RADIUS_M, 1, MAX_SEARCH_RADIUS_M)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'max_results and radius must be numbers'}), 400
+    stream_format = requested_stream_format(data, request)
 
     try:
         # Build the query URL
-        if text:
-            # Text-based search
-            if specialisation:
-                # Clean specialisation for URL
-                clean_spec = specialisation.replace(' ', '+').lower()
-                query = f"{clean_spec}+doctor+in+{text.replace(' ', '+')}"
-            else:
-                query = f"doctors+hospitals+medical+in+{text.replace(' ', '+')}"
-            
-            url = (
-                f"https://maps.googleapis.com/maps/api/place/textsearch/json"
-                f"?query={query}"
-                f"&type=doctor"
-                f"&key={GOOGLE_MAPS_API_KEY}"
-            )
-        elif lat is not None and lng is not None:
-            # Location-based search
-            if specialisation:
-                # Use keyword for specialisation
-                clean_spec = specialisation.replace(' ', '+').lower()
-                url = (
-                    f"https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                    f"?location={lat},{lng}"
-                    f"&radius=25000"  # Increased radius to 25km
-                    f"&type=doctor"
-                    f"&keyword={clean_spec}"
-                    f"&key={GOOGLE_MAPS_API_KEY}"
-                )
-            else:
-                url = (
-                    f"https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-                    f"?location={lat},{lng}"
-                    f"&radius=25000"
-                    f"&type=doctor"
-                    f"&key={GOOGLE_MAPS_API_KEY}"
-                )
-        else:
+        url = build_doctor_search_url(lat, lng, text, specialisation, radius)
+        if not url:
             return jsonify({'error': 'Please provide either coordinates (lat, lng) or a text location'}), 400
 
-        doctors = []
-        next_page_token = None
-        page_count = 0
-        max_pages = 3  # Google Places API allows up to 3 pages
-
-        while page_count < max_pages and len(doctors) < max_results:
-            # Add page token if available
-            current_url = url + (f"&pagetoken={next_page_token}" if next_page_token else "")
-            
-            # Make the API request
-            response = requests.get(current_url)
-            result = response.json()
-
-            if result.get("status") not in ["OK", "ZERO_RESULTS"]:
-                return jsonify({
-                    'error': 'Google Places API error', 
-                    'details': result,
-                    'status': result.get("status")
-                }), 500
-
-            # Process results
-            for place in result.get("results", []):
-                # Skip if we've reached max results
-                if len(doctors) >= max_results:
-                    break
-                
-                # Extract basic information
-                doctor_info = {
-                    'id': place.get('place_id'),
-                    'name': place.get('name'),
-                    'address': place.get('vicinity') or place.get('formatted_address'),
-                    'location': place.get('geometry', {}).get('location'),
-                    'rating': place.get('rating'),
-                    'user_ratings_total': place.get('user_ratings_total', 0),
-                    'price_level': place.get('price_level'),
-                    'open_now': place.get('opening_hours', {}).get('open_now'),
-                    'types': place.get('types', []),
-                    'photos': place.get('photos', [])[:1] if place.get('photos') else []  # Get first photo only
-                }
-                
-                # Calculate distance if user location provided
-                if lat and lng and doctor_info.get('location'):
-                    doctor_info['distance'] = round(calculate_distance(
-                        lat, lng,
-                        doctor_info['location']['lat'],
-                        doctor_info['location']['lng']
-                    ), 2)
-                
-                # Add photo URL if available
-                if doctor_info['photos']:
-                    photo_reference = doctor_info['photos'][0].get('photo_reference')
-                    if photo_reference:
-                        doctor_info['photo_url'] = (
-                            f"https://maps.googleapis.com/maps/api/place/photo"
-                            f"?maxwidth=400&photoreference={photo_reference}"
-                            f"&key={GOOGLE_MAPS_API_KEY}"
-                        )
-
-                doctors.append(doctor_info)
-
-            # Check for next page token
-            next_page_token = result.get("next_page_token")
-            page_count += 1
-
-            # Break if no more pages
-            if not next_page_token:
-                break
-
-            # Google requires a delay before using the next page token
-            time.sleep(2)
-
-        # Sort doctors based on the specified criteria
-        doctors = sort_doctors(doctors, sort_by, lat, lng)
-
-        # Limit results to max_results
-        doctors = doctors[:max_results]
-
-        # Add summary statistics
-        summary = {
-            'total_found': len(doctors),
-            'open_now': sum(1 for d in doctors if d.get('open_now')),
-            'with_ratings': sum(1 for d in doctors if d.get('rating')),
-            'average_rating': round(sum(d.get('rating', 0) for d in doctors if d.get('rating')) / 
-                                  max(sum(1 for d in doctors if d.get('rating')), 1), 2)
+        search_params = {
+            'specialisation': specialisation,
+            'location': text if text else f"{lat}, {lng}",
+            'sort_by': sort_by
         }
 
+        if stream_format:
+            # Fetch the first page up front so API errors still get a regular error response
+            pages = fetch_doctor_pages(url, lat, lng, max_results)
+            first_page = next(pages, [])
+            return stream_records(
+                stream_doctors(first_page, pages, sort_by, lat, lng, max_results, search_params, data.get('weights'),
+                               photo_base_url()),
+                stream_format
+            )
+
+        if data.get('paginate'):
+            # Return page 1 now; pages 2-3 are fetched in the background for the cursor
+            context = {'sort_by': sort_by, 'lat': lat, 'lng': lng, 'weights': data.get('weights'),
+                       'search_params': search_params}
+            progress = {}
+            first_page, cursor = page_prefetcher.start(fetch_doctor_pages(url, lat, lng, max_results, progress),
+                                                       context, has_more=lambda: progress.get('more', False))
+            return doctor_page_response(first_page, cursor, context)
+
+        key = search_cache_key(lat, lng, text, specialisation, radius)
+        # Identical concurrent misses share one upstream search
+        cached, cache_state = cached_doctor_search(key, url, max_results)
+        doctors = with_distances(cached['doctors'], lat, lng)
+
+        # Sort doctors based on the specified criteria, keeping the top max_results
+        doctors = sort_doctors(doctors, sort_by, lat, lng, k=max_results, weights=data.get('weights'))
+        base_url = photo_base_url()
+        doctors = [with_photo_url(doctor, base_url) for doctor in doctors]
+
         return jsonify({
             'doctors': doctors,
-            'summary': summary,
-            'search_params': {
-                'specialisation': specialisation,
-                'location': text if text else f"{lat}, {lng}",
-                'sort_by': sort_by
-            }
-        }), 200
+            'summary': summarize_doctors(doctors),
+            'search_params': search_params
+        }), 200, {'X-Cache': cache_state}
 
+    except PlacesAPIError as e:
+        return places_error_response(e)
     except requests.exceptions.RequestException as e:
         return jsonify({
             'error': 'Network error while fetching data',
@@ -275,7 +484,70 @@ def get_nearby_doctors():
             'details': str(e)
         }), 500
 
+def get_nearby_doctors_page(cursor):
+    """Serve a follow-up page of a paginated search from the prefetch buffer"""
+    try:
+        page, next_cursor, context = page_prefetcher.get_page(cursor)
+        return doctor_page_response(page, next_cursor, context)
+    except CursorExpiredError:
+        return jsonify({'error': 'Cursor expired or invalid, please search again'}), 410
+    except TimeoutError:
+        return jsonify({'error': 'Next page is not ready yet, please retry'}), 503
+    except PlacesAPIError as e:
+        return places_error_response(e)
+    except requests.exceptions.RequestException as e:
+        return jsonify({
+            'error': 'Network error while fetching data',
+            'details': f'Request failed: {str(e)}'
+        }), 500
+
+@app.route('/doctor-details/batch', methods=['POST'])
+@request_deadline.with_latency_budget(DETAILS_BATCH_TIMEOUT)
+def get_doctor_details_batch():
+    """Get details for many doctors/clinics in one round trip"""
+    data = request.get_json() or {}
+    place_ids = data.get('place_ids')
+    if not isinstance(place_ids, list) or not all(isinstance(pid, str) and pid for pid in place_ids):
+        return jsonify({'error': 'place_ids must be a list of place id strings'}), 400
+
+    unique_ids = list(dict.fromkeys(place_ids))
+    if len(unique_ids) > DETAILS_BATCH_MAX_IDS:
+        return jsonify({'error': f'At most {DETAILS_BATCH_MAX_IDS} place_ids per batch'}), 400
+
+    # get_place_details does the one counted cache lookup per id; ids already
+    # in memory are queued first so they are not stuck behind Google fetches
+    results = {}
+    sources = {place_id: {} for place_id in unique_ids}
+    futures = {request_deadline.submit(details_executor, get_place_details, place_id, sources[place_id]): place_id
+               for place_id in sorted(unique_ids, key=lambda pid: place_cache.memory.peek(pid) is None)}
+    done, pending = wait(futures, timeout=request_deadline.remaining())
+    for future, place_id in futures.items():
+        if future in pending:
+            future.cancel()
+            results[place_id] = {'status': 'timeout', 'details': None}
+            continue
+        try:
+            details = future.result()
+        except Exception as e:
+            results[place_id] = {'status': 'error', 'details': None, 'error': str(e)}
+            continue
+        if not details:
+            results[place_id] = {'status': 'not_found', 'details': None}
+        else:
+            results[place_id] = {'status': 'cached' if sources[place_id].get('cached') else 'fetched', 'details': details}
+
+    statuses = [r['status'] for r in results.values()]
+    return jsonify({
+        'results': {place_id: results[place_id] for place_id in unique_ids},
+        'summary': {
+            'requested': len(place_ids),
+            'unique': len(unique_ids),
+            **{status: statuses.count(status) for status in ('cached', 'fetched', 'not_found', 'timeout', 'error')}
+        }
+    }), 200
+
 @app.route('/doctor-details/<place_id>', methods=['GET'])
+@request_deadline.with_latency_budget(DETAILS_LATENCY_BUDGET)
 def get_doctor_details(place_id):
     """Get detailed information about a specific doctor/clinic"""
     try:
@@ -293,6 +565,65 @@ def get_doctor_details(place_id):
             'details': str(e)
         }), 500
 
+def fetch_photo(photo_reference):
+    """Download the original photo from Google and store its thumbnails"""
+    photo_url = (
+        f"{GOOGLE_MAPS_BASE_URL}/place/photo"
+        f"?maxwidth=1600&photoreference={photo_reference}"
+        f"&key={GOOGLE_MAPS_API_KEY}"
+    )
+    response = http_client.get(photo_url, priority=BACKGROUND)
+    if response.status_code != 200 or not response.headers.get('Content-Type', '').startswith('image/'):
+        raise ValueError(f"Photo fetch failed with status {response.status_code}")
+    photo_cache.store(photo_reference, response.content)
+
+@app.route('/photo/<photo_reference>', methods=['GET'])
+def get_photo(photo_reference):
+    """Serve a resized, cacheable thumbnail of a Google place photo"""
+    if not PHOTO_REFERENCE_RE.match(photo_reference):
+        return jsonify({'error': 'Invalid photo reference'}), 400
+
+    width = photo_cache.pick_width(request.args.get('w', 400, type=int))
+    fmt = request.args.get('format')
+    if fmt not in PHOTO_FORMATS:
+        fmt = 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+    etag = photo_cache.etag(photo_reference, width, fmt)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={PHOTO_MAX_AGE}, immutable',
+        'Vary': 'Accept'
+    }
+    if request.if_none_match.contains(etag.strip('"')):
+        return '', 304, headers
+
+    # An open file keeps serving even if the thumbnail is evicted meanwhile
+    photo = photo_cache.get(photo_reference, width, fmt)
+    if photo is None:
+        try:
+            photo_flight.do(photo_reference, lambda: fetch_photo(photo_reference))
+        except Exception as e:
+            return jsonify({'error': 'Failed to fetch photo', 'details': str(e)}), 502
+        photo = photo_cache.get(photo_reference, width, fmt)
+        if photo is None:
+            return jsonify({'error': 'Photo not available'}), 502
+
+    response = send_file(photo, mimetype=PHOTO_FORMATS[fmt][1], conditional=False, etag=False)
+    response.headers.update(headers)
+    return response
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Return cache statistics"""
+    return jsonify({
+        'place_cache': place_cache.stats(),
+        'http': http_client.stats(),
+        'page_prefetch': page_prefetcher.stats(),
+        'search_cache': search_cache.stats(),
+        'search_singleflight': search_flight.stats(),
+        'photo_cache': photo_cache.stats(),
+        'quota': get_quota_scheduler().stats()
+    }), 200
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Endpoint not found'}), 404
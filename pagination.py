@@ -0,0 +1,154 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import deadline as request_deadline
+
+
+class CursorExpiredError(Exception):
+    """The cursor is unknown, malformed or its search has been evicted."""
+
+
+class PrefetchedSearch:
+    def __init__(self, context):
+        self.context = context
+        self.pages = []
+        self.done = False
+        self.error = None
+        self.created_at = time.monotonic()
+        self.cond = threading.Condition()
+
+
+class PagePrefetcher:
+    """Serve paginated upstream results through opaque cursors.
+
+    `start` consumes the first page of a page iterator on the caller's thread
+    and hands the rest of the iterator to a background worker, which buffers
+    every following page (the iterator itself is responsible for any delay
+    between upstream pages). `get_page` then serves cursors from that buffer,
+    waiting for the worker only if the page has not arrived yet. A search that
+    expires or is evicted stops being drained before its next upstream page.
+    """
+
+    def __init__(self, ttl=600, max_searches=256, max_workers=4):
+        self.ttl = ttl
+        self.max_searches = max_searches
+        self._searches = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="page-prefetch")
+        self.started = 0
+        self.buffered_hits = 0
+        self.waits = 0
+        self.evictions = 0
+        self.cancelled = 0
+
+    @staticmethod
+    def cursor(search_id, index):
+        return f"{search_id}.{index}"
+
+    def start(self, pages, context=None, has_more=None):
+        """Return (first page, cursor for page 2 or None); remaining pages are prefetched.
+
+        `has_more()`, when given, is asked after the first page whether the
+        iterator will yield another; if not, no cursor is issued.
+        """
+        first_page = next(pages, [])
+        if has_more is not None and not has_more():
+            self._close(pages)
+            return first_page, None
+        search_id = uuid.uuid4().hex
+        search = PrefetchedSearch(context or {})
+        search.pages.append(first_page)
+        with self._lock:
+            self._expire()
+            self._searches[search_id] = search
+            self.started += 1
+        self._executor.submit(self._drain, search_id, search, pages)
+        return first_page, self.cursor(search_id, 1)
+
+    @staticmethod
+    def _close(pages):
+        close = getattr(pages, 'close', None)
+        if close is not None:
+            close()
+
+    def _live(self, search_id, search):
+        with self._lock:
+            return self._searches.get(search_id) is search
+
+    def _drain(self, search_id, search, pages):
+        try:
+            while self._live(search_id, search):
+                page = next(pages, None)
+                if page is None:
+                    break
+                with search.cond:
+                    search.pages.append(page)
+                    search.cond.notify_all()
+            else:
+                # Nobody can fetch this search's cursors any more; stop spending quota on it
+                self.cancelled += 1
+        except Exception as e:
+            search.error = e
+        finally:
+            self._close(pages)
+            with search.cond:
+                search.done = True
+                search.cond.notify_all()
+
+    def get_page(self, cursor, timeout=30):
+        """Return (page, next cursor or None, context) for a cursor issued by this prefetcher.
+
+        Waits at most `timeout` seconds, and never past the caller's latency budget.
+        """
+        budget = request_deadline.remaining()
+        if budget is not None:
+            timeout = min(timeout, budget)
+        try:
+            search_id, index = cursor.rsplit(".", 1)
+            index = int(index)
+        except (AttributeError, ValueError):
+            raise CursorExpiredError(cursor)
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is None:
+                raise CursorExpiredError(cursor)
+            self._searches.move_to_end(search_id)
+
+        with search.cond:
+            if index < len(search.pages):
+                self.buffered_hits += 1
+            else:
+                self.waits += 1
+                search.cond.wait_for(lambda: index < len(search.pages) or search.done, timeout=timeout)
+            if index >= len(search.pages):
+                if search.error is not None:
+                    raise search.error
+                if not search.done:
+                    raise TimeoutError(f"Page {index} of search {search_id} not ready")
+                return [], None, search.context
+            page = search.pages[index]
+            has_more = index + 1 < len(search.pages) or not search.done
+        return page, self.cursor(search_id, index + 1) if has_more else None, search.context
+
+    def _expire(self):
+        now = time.monotonic()
+        for search_id, search in list(self._searches.items()):
+            if now - search.created_at > self.ttl:
+                del self._searches[search_id]
+                self.evictions += 1
+        while len(self._searches) >= self.max_searches:
+            self._searches.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'active_searches': len(self._searches),
+            'started': self.started,
+            'buffered_hits': self.buffered_hits,
+            'waits': self.waits,
+            'evictions': self.evictions,
+            'cancelled': self.cancelled,
+        }
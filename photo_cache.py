@@ -0,0 +1,130 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+PHOTO_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+class PhotoCache:
+    """On-disk cache of resized place photos with size-bounded LRU eviction.
+
+    Each upstream photo is decoded once and stored as a thumbnail for every
+    configured width and format. Files are named after a hash of the photo
+    reference, so their content never changes and the ETag can be derived
+    from the name. File mtimes track recency; once the directory exceeds
+    `max_bytes` the least recently served files are deleted. Hits are handed
+    out as open files, so a thumbnail evicted while it is being sent is still
+    served in full.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, widths=(160, 400)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.widths = tuple(sorted(widths))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in self._cached_files())
+
+    def pick_width(self, requested):
+        """Smallest configured width that is at least the requested one."""
+        for width in self.widths:
+            if requested <= width:
+                return width
+        return self.widths[-1]
+
+    @staticmethod
+    def key(photo_reference):
+        return hashlib.sha256(photo_reference.encode()).hexdigest()[:32]
+
+    def etag(self, photo_reference, width, fmt):
+        return f'"{self.key(photo_reference)}-{width}-{fmt}"'
+
+    def path(self, photo_reference, width, fmt):
+        return os.path.join(self.directory, f"{self.key(photo_reference)}_{width}.{fmt}")
+
+    def get(self, photo_reference, width, fmt):
+        """The cached thumbnail opened for reading, or None; a hit refreshes its recency."""
+        path = self.path(photo_reference, width, fmt)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(f.fileno())
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def store(self, photo_reference, data):
+        """Decode the original photo once and write every thumbnail variant."""
+        image = Image.open(io.BytesIO(data))
+        image.draft('RGB', (self.widths[-1], self.widths[-1] * 4))
+        image = image.convert('RGB')
+        written = 0
+        for width in self.widths:
+            thumb = image.copy()
+            thumb.thumbnail((width, width * 4), Image.LANCZOS)
+            for fmt, (pil_format, _, options) in PHOTO_FORMATS.items():
+                buf = io.BytesIO()
+                thumb.save(buf, pil_format, **options)
+                path = self.path(photo_reference, width, fmt)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(buf.getbuffer())
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                written += buf.getbuffer().nbytes - old_size
+        with self._lock:
+            self._bytes += written
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            entries = []
+            for entry in self._cached_files():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+            for _, size, path in entries:
+                if self._bytes <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                self._bytes -= size
+                self.evictions += 1
+
+    def _cached_files(self):
+        """Finished thumbnails; another writer's in-flight .tmp files are left alone."""
+        return (e for e in os.scandir(self.directory) if e.is_file() and not e.name.endswith('.tmp'))
+
+    def stats(self):
+        return {
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
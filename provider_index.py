@@ -0,0 +1,150 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    a = (math.sin(math.radians(lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class ProviderIndex:
+    """Registry of known ambulance providers bucketed on a fixed lat/lng grid.
+
+    Providers are stored in the grid cell containing them, so a radius query
+    only scans the handful of cells overlapping its bounding box. Separately,
+    each cell remembers when a complete Google search centred in it last ran
+    and the order Google ranked the results in; queries centred in a covered
+    cell can be answered locally in that order, and `coverage` reports whether
+    the cell is due for a background refresh. A provider's `open_now` is only
+    reported for `open_now_ttl` seconds after it was seen and is None after
+    that, since opening state changes far sooner than `provider_ttl`.
+    """
+
+    def __init__(self, cell_deg=0.02, cell_ttl=3600, provider_ttl=7 * 86400, open_now_ttl=15 * 60, db_path=None):
+        self.cell_deg = cell_deg
+        self.cell_ttl = cell_ttl
+        self.provider_ttl = provider_ttl
+        self.open_now_ttl = open_now_ttl
+        self._providers = {}
+        self._cells = defaultdict(set)
+        self._covered = {}
+        self._lock = threading.RLock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS providers (place_id TEXT PRIMARY KEY, record TEXT NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS coverage (cell TEXT PRIMARY KEY, refreshed_at REAL NOT NULL)")
+            if 'ranking' not in [row[1] for row in self._db.execute("PRAGMA table_info(coverage)")]:
+                self._db.execute("ALTER TABLE coverage ADD COLUMN ranking TEXT")
+            self._db.commit()
+            self._load()
+
+    def _load(self):
+        for (record,) in self._db.execute("SELECT record FROM providers"):
+            self._insert(json.loads(record))
+        for cell, refreshed_at, ranking in self._db.execute("SELECT cell, refreshed_at, ranking FROM coverage"):
+            self._covered[tuple(int(c) for c in cell.split(","))] = (refreshed_at, json.loads(ranking or "[]"))
+
+    def cell_of(self, lat, lng):
+        return (math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg))
+
+    def _insert(self, record):
+        old = self._providers.get(record['place_id'])
+        if old is not None:
+            self._cells[self.cell_of(old['lat'], old['lng'])].discard(record['place_id'])
+        self._providers[record['place_id']] = record
+        self._cells[self.cell_of(record['lat'], record['lng'])].add(record['place_id'])
+
+    def upsert(self, place_id, lat, lng, name, phone_number, open_now, opening_hours=None):
+        record = {
+            'place_id': place_id,
+            'lat': float(lat),
+            'lng': float(lng),
+            'name': name,
+            'phone_number': phone_number,
+            'open_now': open_now,
+            'opening_hours': opening_hours,
+            'seen_at': time.time(),
+        }
+        with self._lock:
+            self._insert(record)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO providers (place_id, record) VALUES (?, ?)",
+                                 (place_id, json.dumps(record)))
+                self._db.commit()
+        return record
+
+    def mark_refreshed(self, lat, lng, ranking=()):
+        """Record a complete search centred in this cell; `ranking` is its place ids in Google's order."""
+        cell = self.cell_of(lat, lng)
+        now = time.time()
+        ranking = list(ranking)
+        with self._lock:
+            self._covered[cell] = (now, ranking)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO coverage (cell, refreshed_at, ranking) VALUES (?, ?, ?)",
+                                 (f"{cell[0]},{cell[1]}", now, json.dumps(ranking)))
+                self._db.commit()
+
+    def coverage(self, lat, lng, ttl=None):
+        """Return 'fresh', 'stale' or 'missing' for the cell containing lat/lng (stale after `ttl`, default cell_ttl)."""
+        covered = self._covered.get(self.cell_of(lat, lng))
+        if covered is None:
+            return 'missing'
+        return 'fresh' if time.time() - covered[0] <= (self.cell_ttl if ttl is None else ttl) else 'stale'
+
+    def query(self, lat, lng, radius_m, limit=None):
+        """Providers within radius_m of lat/lng.
+
+        Providers from the cell's last search come first in Google's ranking,
+        then any others nearest first. Returned records are copies whose
+        `open_now` is None once older than `open_now_ttl`.
+        """
+        dlat = radius_m / 111320.0
+        dlng = radius_m / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+        min_cell = self.cell_of(lat - dlat, lng - dlng)
+        max_cell = self.cell_of(lat + dlat, lng + dlng)
+        now = time.time()
+        cutoff = now - self.provider_ttl
+        found = []
+        with self._lock:
+            ranking = self._covered.get(self.cell_of(lat, lng), (None, []))[1]
+            rank_of = {place_id: rank for rank, place_id in enumerate(ranking)}
+            for i in range(min_cell[0], max_cell[0] + 1):
+                for j in range(min_cell[1], max_cell[1] + 1):
+                    for place_id in self._cells.get((i, j), ()):
+                        record = self._providers[place_id]
+                        if record['seen_at'] < cutoff:
+                            continue
+                        distance = haversine_m(lat, lng, record['lat'], record['lng'])
+                        if distance <= radius_m:
+                            rank = rank_of.get(place_id)
+                            found.append(((0, rank) if rank is not None else (1, distance), record))
+        found.sort(key=lambda x: x[0])
+        results = []
+        for _, record in found[:limit]:
+            record = dict(record)
+            if now - record['seen_at'] > self.open_now_ttl:
+                record['open_now'] = None
+            results.append(record)
+        return results
+
+    def stats(self):
+        now = time.time()
+        return {
+            'providers': len(self._providers),
+            'cells': sum(1 for ids in self._cells.values() if ids),
+            'covered_cells': len(self._covered),
+            'stale_cells': sum(1 for t, _ in self._covered.values() if now - t > self.cell_ttl),
+            'persistent': self._db is not None,
+        }
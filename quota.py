@@ -0,0 +1,307 @@
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, so get_quota_scheduler falls back to a per-process bucket
+    fcntl = None
+
+# Lower value = served first.
+EMERGENCY = 0   # ambulance search/details, geocoding for calls
+SEARCH = 1      # doctor searches and pagination
+BACKGROUND = 2  # doctor details, photos, cache refreshes
+
+PRIORITY_NAMES = {EMERGENCY: 'emergency', SEARCH: 'search', BACKGROUND: 'background'}
+
+
+class QuotaWaitTimeout(TimeoutError):
+    """No token became available for this priority within the allowed wait."""
+
+
+class QuotaScheduler:
+    """Token bucket for an upstream quota that hands out tokens by priority.
+
+    Tokens refill at `rate` per second up to `burst`. Waiting callers are
+    queued by (priority, arrival), so emergency traffic is always served
+    before queued search or background calls. `reserve` tokens are held back
+    for emergency traffic: lower priorities only proceed while more than
+    `reserve` tokens remain, so a burst of doctor searches cannot drain the
+    bucket in front of an ambulance lookup.
+    """
+
+    def __init__(self, rate=50.0, burst=None, reserve=2):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.reserve = max(0, min(reserve, int(self.burst) - 1))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._timeouts = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: deque(maxlen=512) for p in PRIORITY_NAMES}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _needed(self, priority):
+        return 1 if priority == EMERGENCY else 1 + self.reserve
+
+    def acquire(self, priority=SEARCH, timeout=None):
+        """Block until a token is granted; returns the seconds spent waiting."""
+        start = time.monotonic()
+        expires_at = start + timeout if timeout is not None else None
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    self._refill()
+                    needed = self._needed(priority)
+                    if self._waiters[0] == entry and self._tokens >= needed:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        waited = time.monotonic() - start
+                        self._granted[priority] += 1
+                        self._waits[priority].append(waited)
+                        self._cond.notify_all()
+                        return waited
+                    sleep = max((needed - self._tokens) / self.rate, 0.001)
+                    if expires_at is not None:
+                        remaining = expires_at - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts[priority] += 1
+                            raise QuotaWaitTimeout(f"No {PRIORITY_NAMES[priority]} quota within {timeout}s")
+                        sleep = min(sleep, remaining)
+                    self._cond.wait(sleep)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def stats(self):
+        with self._cond:
+            self._refill()
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                depth[PRIORITY_NAMES[priority]] += 1
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                pick = lambda q: round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 1) if waits else None
+                classes[name] = {
+                    'queued': depth[name],
+                    'granted': self._granted[priority],
+                    'timeouts': self._timeouts[priority],
+                    'wait_p50_ms': pick(0.50),
+                    'wait_p95_ms': pick(0.95),
+                    'wait_max_ms': pick(1.0),
+                }
+            return {
+                'rate_per_s': self.rate,
+                'burst': self.burst,
+                'reserve': self.reserve,
+                'tokens': round(self._tokens, 2),
+                'classes': classes,
+            }
+
+
+class SharedQuotaScheduler:
+    """QuotaScheduler whose bucket lives in a file shared by every process on the host.
+
+    ambulance.py and location.py run as separate processes but spend the same
+    Google Maps key, so both take tokens from the bucket stored in `path`,
+    read and written under an exclusive flock. Every waiting caller registers
+    its priority in the file and is only granted a token while no caller of
+    a higher priority, in any process, is waiting; `reserve` tokens are held
+    back for emergency traffic as in QuotaScheduler. Waiters poll the file, so
+    arrival order within a priority is not guaranteed. Registrations left by
+    processes that have exited are discarded.
+    """
+
+    POLL_INTERVAL = 0.002
+
+    def __init__(self, path, rate=50.0, burst=None, reserve=2):
+        self.path = path
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.reserve = max(0, min(reserve, int(self.burst) - 1))
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # flock is per open file, so threads of this process also need a lock.
+        self._lock = threading.Lock()
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._timeouts = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: deque(maxlen=512) for p in PRIORITY_NAMES}
+
+    @contextmanager
+    def _shared_state(self):
+        """The bucket state under the file lock; changes are written back if the caller marks it dirty."""
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                raw = b""
+                while True:
+                    chunk = os.read(self._fd, 65536)
+                    if not chunk:
+                        break
+                    raw += chunk
+                try:
+                    state = json.loads(raw)
+                    if not isinstance(state, dict) or not {'tokens', 'updated', 'waiting'} <= state.keys():
+                        raise ValueError("incomplete quota state")
+                except ValueError:
+                    state = {'tokens': self.burst, 'updated': time.time(), 'waiting': {}, 'dirty': True}
+                state.setdefault('dirty', False)
+                self._prune(state)
+                yield state
+                if state.pop('dirty'):
+                    payload = json.dumps(state).encode()
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    os.ftruncate(self._fd, 0)
+                    os.write(self._fd, payload)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _prune(state):
+        for pid in list(state['waiting']):
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                del state['waiting'][pid]
+                state['dirty'] = True
+            except (PermissionError, ValueError):
+                pass
+
+    def _refill(self, state):
+        now = time.time()
+        state['tokens'] = min(self.burst, state['tokens'] + max(now - state['updated'], 0) * self.rate)
+        state['updated'] = now
+
+    @staticmethod
+    def _register(state, priority, delta):
+        waiting = state['waiting'].setdefault(str(os.getpid()), {})
+        count = waiting.get(str(priority), 0) + delta
+        if count > 0:
+            waiting[str(priority)] = count
+        else:
+            waiting.pop(str(priority), None)
+        if not waiting:
+            del state['waiting'][str(os.getpid())]
+        state['dirty'] = True
+
+    def _needed(self, priority):
+        return 1 if priority == EMERGENCY else 1 + self.reserve
+
+    def acquire(self, priority=SEARCH, timeout=None):
+        """Block until a token is granted; returns the seconds spent waiting."""
+        start = time.monotonic()
+        expires_at = start + timeout if timeout is not None else None
+        with self._shared_state() as state:
+            self._register(state, priority, 1)
+        registered = True
+        try:
+            while True:
+                with self._shared_state() as state:
+                    self._refill(state)
+                    needed = self._needed(priority)
+                    ahead = any(int(p) < priority and n > 0
+                                for waiting in state['waiting'].values() for p, n in waiting.items())
+                    if not ahead and state['tokens'] >= needed:
+                        state['tokens'] -= 1
+                        self._register(state, priority, -1)
+                        registered = False
+                    sleep = max((needed - state['tokens']) / self.rate, self.POLL_INTERVAL)
+                if not registered:
+                    waited = time.monotonic() - start
+                    with self._lock:
+                        self._granted[priority] += 1
+                        self._waits[priority].append(waited)
+                    return waited
+                if expires_at is not None:
+                    remaining = expires_at - time.monotonic()
+                    if remaining <= 0:
+                        with self._lock:
+                            self._timeouts[priority] += 1
+                        raise QuotaWaitTimeout(f"No {PRIORITY_NAMES[priority]} quota within {timeout}s")
+                    sleep = min(sleep, remaining)
+                time.sleep(sleep)
+        finally:
+            if registered:
+                with self._shared_state() as state:
+                    self._register(state, priority, -1)
+
+    def stats(self):
+        with self._shared_state() as state:
+            self._refill(state)
+            tokens = state['tokens']
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiting in state['waiting'].values():
+                for priority, count in waiting.items():
+                    depth[PRIORITY_NAMES[int(priority)]] += count
+        with self._lock:
+            classes = {}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                pick = lambda q: round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 1) if waits else None
+                classes[name] = {
+                    'queued': depth[name],
+                    'granted': self._granted[priority],
+                    'timeouts': self._timeouts[priority],
+                    'wait_p50_ms': pick(0.50),
+                    'wait_p95_ms': pick(0.95),
+                    'wait_max_ms': pick(1.0),
+                }
+        return {
+            'shared_file': self.path,
+            'rate_per_s': self.rate,
+            'burst': self.burst,
+            'reserve': self.reserve,
+            'tokens': round(tokens, 2),
+            'classes': classes,
+        }
+
+
+def default_quota_file():
+    """One bucket file per Google Maps key, in the system temp directory."""
+    key = os.getenv("GOOGLE_MAPS_API_KEY") or "default"
+    return os.path.join(tempfile.gettempdir(), f"google-quota-{hashlib.sha256(key.encode()).hexdigest()[:12]}.json")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_quota_scheduler():
+    """Scheduler for the Google Maps key, configured from GOOGLE_QPS / GOOGLE_BURST / GOOGLE_QPS_RESERVE.
+
+    The bucket is shared through GOOGLE_QUOTA_FILE by every service process on
+    the host (see SharedQuotaScheduler). Setting GOOGLE_QUOTA_FILE to an empty
+    string gives each process its own in-memory bucket instead.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            rate = float(os.getenv("GOOGLE_QPS", "50"))
+            burst = float(os.getenv("GOOGLE_BURST", str(rate)))
+            reserve = int(os.getenv("GOOGLE_QPS_RESERVE", "2"))
+            path = os.getenv("GOOGLE_QUOTA_FILE", default_quota_file())
+            if path and fcntl is not None:
+                _scheduler = SharedQuotaScheduler(path, rate=rate, burst=burst, reserve=reserve)
+            else:
+                _scheduler = QuotaScheduler(rate=rate, burst=burst, reserve=reserve)
+        return _scheduler
@@ -0,0 +1,83 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+DEFAULT_WEIGHTS = {
+    'distance': 0.4,
+    'rating': 0.3,
+    'reviews': 0.2,
+    'open_now': 0.1,
+}
+
+
+def haversine_km(lats, lngs, lat, lng):
+    """Vectorized haversine distance (km) from (lat, lng) to every point in lats/lngs."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - np.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def top_k(keys, k=None):
+    """Indices of the k smallest keys in ascending order, ties kept in input order.
+
+    Uses a partial partition to find the k-th key, so only the selected
+    candidates are fully sorted. The result matches a stable full sort.
+    """
+    n = len(keys)
+    if k is None or k >= n:
+        return np.argsort(keys, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    kth = np.partition(keys, k - 1)[k - 1]
+    better = np.flatnonzero(keys < kth)
+    ties = np.flatnonzero(keys == kth)[:k - len(better)]
+    selected = np.concatenate([better, ties])
+    return selected[np.argsort(keys[selected], kind='stable')]
+
+
+class RankingEngine:
+    """Candidate doctors held as NumPy columns for vectorized distance and scoring."""
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        locations = [c.get('location') for c in candidates]
+        self.lats = np.array([loc['lat'] if loc else np.nan for loc in locations], dtype=float)
+        self.lngs = np.array([loc['lng'] if loc else np.nan for loc in locations], dtype=float)
+        self.ratings = np.array([c.get('rating') or 0 for c in candidates], dtype=float)
+        self.reviews = np.array([c.get('user_ratings_total') or 0 for c in candidates], dtype=float)
+        self.open_now = np.array([bool(c.get('open_now')) for c in candidates], dtype=bool)
+
+    def distances(self, lat, lng):
+        """Distance in km from (lat, lng) for every candidate; inf where location is unknown."""
+        d = haversine_km(self.lats, self.lngs, lat, lng)
+        d[np.isnan(d)] = np.inf
+        return d
+
+    def weighted_scores(self, lat=None, lng=None, weights=None):
+        """Higher is better: weighted sum of distance, rating, review count and open_now, each scaled to [0, 1]."""
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        score = weights['rating'] * self.ratings / 5.0
+        max_reviews = self.reviews.max() if len(self.reviews) else 0
+        if max_reviews > 0:
+            score += weights['reviews'] * np.log1p(self.reviews) / np.log1p(max_reviews)
+        score += weights['open_now'] * self.open_now
+        if lat is not None and lng is not None:
+            # 1 at the user's location, 0.5 at 5 km, 0 where unknown
+            score += weights['distance'] / (1.0 + self.distances(lat, lng) / 5.0)
+        return score
+
+    def rank(self, sort_by, lat=None, lng=None, k=None, weights=None):
+        """Return (indices of the top k candidates in rank order, distances or None)."""
+        distances = None
+        if sort_by == 'distance' and lat and lng:
+            distances = self.distances(lat, lng)
+            keys = distances
+        elif sort_by == 'score':
+            keys = -self.weighted_scores(lat, lng, weights) if lat and lng else -self.weighted_scores(weights=weights)
+        else:
+            # Open places first, then higher rating (ratings are within 0-5)
+            keys = (~self.open_now) * 10.0 - self.ratings
+        return top_k(keys, k), distances
@@ -0,0 +1,234 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+WORD_RE = re.compile(r"[^\W_]+", re.UNICODE)
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Words that may differ between two prompts without changing what is being
+# asked. Everything else (symptoms, drugs, conditions, numbers, ages, tense)
+# is a clinical term and must match exactly for a near-duplicate hit.
+FILLER_WORDS = frozenset("""
+    a an the i im me my am is are be do does did and also just really very so
+    please hi hello hey now currently some
+""".split())
+# Verbs and prepositions that sit between a negation and what it negates
+# ("don't have any diabetes"); also ignored when comparing prompts.
+NEGATION_CARRY_WORDS = frozenset("""
+    have has having take takes taking use using get getting feel feeling any
+    to of with from
+""".split())
+# Negations attach to the next clinical term ("not pregnant" != "pregnant").
+# Contractions reach us split, e.g. "don't" -> "don", "t".
+NEGATION_WORDS = frozenset("""
+    no not never without none nor neither non negative deny denies denied t
+    dont doesnt didnt isnt arent wasnt werent havent hasnt hadnt cant cannot wont
+    don doesn didn isn aren wasn weren haven hasn hadn won wouldn shouldn couldn
+""".split())
+
+
+def normalize_prompt(text):
+    """Lowercase words only, so punctuation, case and spacing do not change the key."""
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+def shingles(normalized):
+    """Word unigrams and bigrams; short symptom prompts have too few trigrams to compare."""
+    words = normalized.split()
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def clinical_terms(normalized):
+    """Clinical terms of a normalized prompt in order, each prefixed with 'not:' when negated.
+
+    Two prompts are only near-duplicates if these are identical. Order is kept
+    because it says which term goes with which ("fever for 2 days and cough
+    for 5 days"), so negation, numbers, ages, drug or condition names and
+    what they attach to can never differ between them.
+    """
+    terms = []
+    negated = False
+    for word in normalized.split():
+        if word in NEGATION_WORDS:
+            negated = True
+        elif word not in FILLER_WORDS and word not in NEGATION_CARRY_WORDS:
+            terms.append(f"not:{word}" if negated else word)
+            negated = False
+    if negated:
+        terms.append("not:")
+    return tuple(terms)
+
+
+class MinHasher:
+    """MinHash signatures with `num_perm` universal hash functions over 61-bit shingle hashes."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items):
+        if not items:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'little')
+                           & MERSENNE_PRIME for s in items], dtype=np.uint64)
+        # a * x + b in wrapping uint64 arithmetic (i.e. mod 2**64 rather than
+        # mod p): cheap to vectorize and mixes well enough for Jaccard estimates.
+        return (np.outer(hashes, self.a) + self.b).min(axis=0)
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        return float(np.mean(sig_a == sig_b))
+
+
+class _Entry:
+    __slots__ = ('value', 'scope', 'signature', 'terms', 'bands', 'expires_at')
+
+    def __init__(self, value, scope, signature, terms, bands, expires_at):
+        self.value = value
+        self.scope = scope
+        self.signature = signature
+        self.terms = terms
+        self.bands = bands
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """Two-layer cache for LLM responses to single-turn prompts.
+
+    The exact layer is keyed by the normalized prompt and a `scope` (e.g. the
+    image class the prompt mentions). The near-duplicate layer compares MinHash
+    signatures of word shingles: LSH banding finds candidates with the same
+    scope, and the best one whose estimated Jaccard similarity is at least
+    `threshold` is served, but only if its clinical terms (see
+    `clinical_terms`) are identical. A cached answer can contain a
+    prescription, so prompts that differ in a negation, a number or a drug
+    or condition name, or pair them up differently, never share one; near
+    hits only absorb filler words, case and punctuation. `near=False` serves exact hits only.
+    Entries expire after `ttl` seconds and the least recently used are
+    evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries=2048, ttl=3600, threshold=0.8, num_perm=64, bands=16, near=True):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.near = near
+        self.hasher = MinHasher(num_perm)
+        self.rows = num_perm // bands
+        self.num_bands = bands
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.expired = 0
+
+    @staticmethod
+    def key(normalized, scope):
+        return hashlib.sha256(f"{scope}\x00{normalized}".encode()).hexdigest()
+
+    def _bands(self, signature, scope):
+        return [(scope, i, signature[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.num_bands)]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            self.expired += 1
+            return None
+        return entry
+
+    def get(self, prompt, scope=None):
+        """Return (value, 'exact' | 'near' | 'miss')."""
+        normalized = normalize_prompt(prompt)
+        key = self.key(normalized, scope)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.value, 'exact'
+            if not self.near:
+                self.misses += 1
+                return None, 'miss'
+
+        signature = self.hasher.signature(shingles(normalized))
+        terms = clinical_terms(normalized)
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature, scope):
+                candidates |= self._buckets.get(band, set())
+            best_key, best_score = None, self.threshold
+            for candidate in candidates:
+                entry = self._live(candidate, now)
+                if entry is None or entry.terms != terms:
+                    continue
+                score = self.hasher.similarity(signature, entry.signature)
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            if best_key is None:
+                self.misses += 1
+                return None, 'miss'
+            self._entries.move_to_end(best_key)
+            self.near_hits += 1
+            return self._entries[best_key].value, 'near'
+
+    def set(self, prompt, value, scope=None):
+        normalized = normalize_prompt(prompt)
+        key = self.key(normalized, scope)
+        signature = self.hasher.signature(shingles(normalized))
+        bands = self._bands(signature, scope)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, scope, signature, clinical_terms(normalized), bands,
+                                        time.monotonic() + self.ttl)
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def bypass(self):
+        """Count a request that was deliberately not served from (or stored in) the cache."""
+        with self._lock:
+            self.bypassed += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'threshold': self.threshold,
+                'near': self.near,
+                'exact_hits': self.exact_hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                'exact_hit_rate': round(self.exact_hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expired': self.expired,
+            }
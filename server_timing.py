@@ -0,0 +1,44 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Wall-clock time spent in each named stage of one request.
+
+    Stages can be timed from worker threads (e.g. an image classified while
+    the history loads); timing the same stage twice adds up. `header()`
+    renders the stages plus the total so far as a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, fn, *args, **kwargs):
+        """Call `fn` and time it as stage `name`; handy for executor.submit."""
+        with self.stage(name):
+            return fn(*args, **kwargs)
+
+    def as_dict(self):
+        """Stage durations in milliseconds, in the order they were first timed, plus 'total'."""
+        with self._lock:
+            timings = {name: round(seconds * 1000, 1) for name, seconds in self._stages.items()}
+        timings['total'] = round((time.perf_counter() - self.started) * 1000, 1)
+        return timings
+
+    def header(self):
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+SUMMARY_LINE_RE = re.compile(r"SUMMARY:\s*(.+)")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English prose)."""
+    return len(text) // 4 + 1
+
+
+def compact_turn(role, text, max_chars=160):
+    """One summary line for a turn leaving the live history.
+
+    Assistant turns already end with a `SUMMARY:` one-liner, which is kept
+    as-is; otherwise the first sentence is used, truncated to `max_chars`.
+    """
+    match = SUMMARY_LINE_RE.search(text) if role == 'assistant' else None
+    line = match.group(1) if match else SENTENCE_END_RE.split(text.strip(), 1)[0]
+    line = " ".join(line.split()).strip(" *_")
+    if len(line) > max_chars:
+        line = line[:max_chars - 1].rstrip() + "…"
+    return f"{'User' if role == 'user' else 'Assistant'}: {line}"
+
+
+class UnknownConversation(KeyError):
+    """The conversation id was never issued by this store, or the conversation has expired or been evicted."""
+
+
+class Conversation:
+    def __init__(self, conversation_id):
+        self.id = conversation_id
+        self.turns = []
+        self.summary = []
+        self.updated = time.monotonic()
+
+    def size(self):
+        return sum(len(text) for _, text in self.turns) + sum(len(line) for line in self.summary)
+
+    def tokens(self):
+        return (sum(estimate_tokens(text) for _, text in self.turns)
+                + sum(estimate_tokens(line) for line in self.summary))
+
+
+class ConversationStore:
+    """Server-side conversation history keyed by conversation id.
+
+    Conversations are kept in LRU order and evicted once there are more than
+    `max_sessions`, their combined text exceeds `max_bytes`, or they have
+    been idle for `ttl` seconds. Each conversation stays within
+    `token_budget`: when it grows past it, the oldest turns (all but the last
+    `keep_recent`) are folded into a rolling summary of one line per turn,
+    and the oldest summary lines are dropped once the summary alone exceeds
+    `summary_budget`. The last `keep_recent` turns are always kept verbatim,
+    so a single very long turn can still exceed the budget on its own.
+
+    Conversation ids are only ever issued by `new_id()`; turns for any other
+    id are rejected, so a client cannot create (or share) a conversation
+    under an id of its own choosing.
+    """
+
+    def __init__(self, max_sessions=10000, max_bytes=64 * 1024 * 1024, ttl=6 * 3600,
+                 token_budget=1500, summary_budget=400, keep_recent=2):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.keep_recent = keep_recent
+        self._conversations = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expired = 0
+        self.compactions = 0
+
+    def new_id(self):
+        """Start an empty conversation and return its (unguessable) id."""
+        conversation_id = uuid.uuid4().hex
+        with self._lock:
+            self._conversations[conversation_id] = Conversation(conversation_id)
+            self.created += 1
+            self._evict()
+        return conversation_id
+
+    def _get(self, conversation_id):
+        conversation = self._conversations.get(conversation_id)
+        if conversation is not None and time.monotonic() - conversation.updated > self.ttl:
+            self._drop(conversation_id)
+            self.expired += 1
+            conversation = None
+        if conversation is not None:
+            self._conversations.move_to_end(conversation_id)
+        return conversation
+
+    def exists(self, conversation_id):
+        with self._lock:
+            return self._get(conversation_id) is not None
+
+    def _drop(self, conversation_id):
+        conversation = self._conversations.pop(conversation_id)
+        self._bytes -= conversation.size()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._conversations:
+            oldest = next(iter(self._conversations.values()))
+            if now - oldest.updated > self.ttl:
+                self.expired += 1
+            elif len(self._conversations) > self.max_sessions or self._bytes > self.max_bytes:
+                self.evictions += 1
+            else:
+                break
+            self._drop(oldest.id)
+
+    def _compact(self, conversation):
+        before = conversation.size()
+        while conversation.tokens() > self.token_budget and len(conversation.turns) > self.keep_recent:
+            conversation.summary.append(compact_turn(*conversation.turns.pop(0)))
+            self.compactions += 1
+        while (conversation.summary
+               and sum(estimate_tokens(line) for line in conversation.summary) > self.summary_budget):
+            conversation.summary.pop(0)
+        self._bytes += conversation.size() - before
+
+    def append(self, conversation_id, role, text):
+        """Record a turn ('user' or 'assistant') and compact the conversation if needed.
+
+        Raises UnknownConversation unless `conversation_id` came from `new_id()` and is still live.
+        """
+        text = text.strip()
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                raise UnknownConversation(conversation_id)
+            if not text:
+                return
+            conversation.turns.append((role, text))
+            conversation.updated = time.monotonic()
+            self._bytes += len(text)
+            self._compact(conversation)
+            self._evict()
+
+    def history(self, conversation_id):
+        """(summary lines, [(role, text), ...]) for the conversation; empty if unknown."""
+        with self._lock:
+            conversation = self._get(conversation_id)
+            if conversation is None:
+                return [], []
+            return list(conversation.summary), list(conversation.turns)
+
+    def context(self, conversation_id):
+        """Prompt-ready history: the rolling summary followed by the recent turns."""
+        summary, turns = self.history(conversation_id)
+        lines = []
+        if summary:
+            lines.append("**Earlier in this conversation:**")
+            lines.extend(f"- {line}" for line in summary)
+        lines.extend(f"**{'User' if role == 'user' else 'Assistant'}:** {text}" for role, text in turns)
+        return "\n".join(lines)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._conversations),
+                'max_sessions': self.max_sessions,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'token_budget': self.token_budget,
+                'created': self.created,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'compactions': self.compactions,
+            }
@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from batcher import MicroBatcher
+
+logger = logging.getLogger(__name__)
+
+INPUT_SHAPE = (224, 224, 3)
+
+# keras runs the original .h5; the tflite backends run a reduced-precision copy
+# converted once and cached on disk. tflite-int8 quantizes weights to int8 and,
+# when calibration images are given, activations as well.
+BACKENDS = ('keras', 'tflite-fp16', 'tflite-int8')
+CALIBRATION_IMAGES = 100
+
+
+_buffers = threading.local()
+
+
+def load_image(file):
+    """Decode an uploaded image into a normalized 224x224x3 float32 array.
+
+    JPEGs are decoded at a reduced scale (1/2 to 1/8) that still covers
+    224x224, so a 12 MP phone photo is never fully materialized. The result
+    is written into a float32 buffer owned by the calling thread and
+    normalized in place; it stays valid until that thread's next call, so
+    callers that keep it longer must copy it.
+    """
+    image = Image.open(file)
+    image.draft("RGB", INPUT_SHAPE[:2])
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image = image.resize(INPUT_SHAPE[:2])
+    buffer = getattr(_buffers, "image", None)
+    if buffer is None:
+        buffer = _buffers.image = np.empty(INPUT_SHAPE, dtype="float32")
+    np.copyto(buffer, np.asarray(image), casting="unsafe")
+    np.divide(buffer, 255.0, out=buffer)
+    return buffer
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def calibration_images(directory, limit=CALIBRATION_IMAGES):
+    """Preprocessed images from a local directory, for int8 calibration and evaluation."""
+    if not directory:
+        return []
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if len(images) >= limit:
+            break
+        try:
+            images.append(load_image(os.path.join(directory, name)).copy())
+        except Exception:
+            logger.warning(f"Skipping unreadable image {name}")
+    return images
+
+
+def converted_model_path(model_path, backend, cache_dir=None):
+    """Where the converted artifact for this exact model file and backend lives."""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(model_path))
+    return os.path.join(cache_dir, f"{stem}.{file_digest(model_path)[:12]}.{backend}.tflite")
+
+
+def convert_model(model_path, backend, cache_dir=None, calibration_dir=None):
+    """Convert the Keras model to a quantized TFLite flatbuffer, reusing a cached copy."""
+    path = converted_model_path(model_path, backend, cache_dir)
+    if os.path.exists(path):
+        return path
+
+    import tensorflow as tf
+    started = time.monotonic()
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(model_path))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if backend == 'tflite-fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        images = calibration_images(calibration_dir)
+        if images:
+            converter.representative_dataset = lambda: ([np.expand_dims(image, axis=0)] for image in images)
+        else:
+            logger.warning("No calibration images; int8 conversion quantizes weights only")
+    flatbuffer = converter.convert()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(flatbuffer)
+    os.replace(tmp_path, path)
+    logger.info(f"Converted {model_path} to {backend} in {time.monotonic() - started:.1f}s ({len(flatbuffer)} bytes)")
+    return path
+
+
+class TFLitePredictor:
+    """predict_on_batch over a TFLite interpreter, one invoke per image.
+
+    The interpreter is not thread-safe; callers serialize through the
+    MicroBatcher worker. Quantized input/output tensors are converted from and
+    to float so callers see the same probabilities as the Keras model.
+    """
+
+    def __init__(self, path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+
+    def predict_on_batch(self, batch):
+        outputs = []
+        for image in batch:
+            x = np.expand_dims(image, axis=0)
+            scale, zero_point = self.input['quantization']
+            if scale:
+                x = np.round(x / scale + zero_point)
+            self.interpreter.set_tensor(self.input['index'], x.astype(self.input['dtype']))
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(self.output['index'])[0]
+            scale, zero_point = self.output['quantization']
+            if scale:
+                y = (y.astype("float32") - zero_point) * scale
+            outputs.append(y.astype("float32"))
+        return np.stack(outputs)
+
+
+def load_backend(model_path, backend='keras', cache_dir=None, calibration_dir=None, num_threads=None):
+    """Return a predict_on_batch callable for the requested backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown skin model backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == 'keras':
+        from tensorflow.keras.models import load_model
+        return load_model(model_path).predict_on_batch
+    path = convert_model(model_path, backend, cache_dir, calibration_dir)
+    return TFLitePredictor(path, num_threads=num_threads).predict_on_batch
+
+
+class ModelNotReady(RuntimeError):
+    """The skin model is still loading (or failed to load)."""
+
+
+class SkinClassifier:
+    """Skin disease CNN loaded on a background thread.
+
+    TensorFlow is imported and the model read from disk off the import path,
+    so the service can accept requests immediately; text-only endpoints never
+    touch the model. Loading ends with a warm-up forward pass so the first
+    real upload does not pay graph tracing costs. Predictions go through a
+    MicroBatcher once the model is ready. A failed load is retried in the
+    background after `retry_backoff` seconds, doubling up to
+    `max_retry_backoff`; `reload()` retries straight away.
+    """
+
+    def __init__(self, model_path, backend='keras', cache_dir=None, calibration_dir=None,
+                 max_batch_size=16, max_wait=0.005, retry_backoff=5.0, max_retry_backoff=300.0):
+        self.model_path = model_path
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.calibration_dir = calibration_dir
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.batcher = None
+        self.error = None
+        self.load_seconds = None
+        self.attempts = 0
+        self.next_retry_at = None
+        self._ready = threading.Event()
+        self._retry_now = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Begin loading in the background; later calls are no-ops."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._load, name="skin-model-loader", daemon=True)
+                self._thread.start()
+        return self
+
+    def reload(self):
+        """Retry a failed load now instead of waiting for the next backoff."""
+        self.start()
+        self._retry_now.set()
+        return self
+
+    def _load(self):
+        delay = self.retry_backoff
+        while True:
+            self.attempts += 1
+            started = time.monotonic()
+            try:
+                predict = load_backend(self.model_path, self.backend, self.cache_dir, self.calibration_dir)
+                predict(np.zeros((1,) + INPUT_SHAPE, dtype="float32"))
+                self.batcher = MicroBatcher(predict, self.max_batch_size, self.max_wait, name="skin-batcher")
+                self.load_seconds = round(time.monotonic() - started, 2)
+                self.error = self.next_retry_at = None
+                logger.info(f"Skin model ({self.backend}) loaded and warmed up in {self.load_seconds}s")
+                return
+            except Exception as e:
+                self.error = f"{e.__class__.__name__}: {e}"
+                self.next_retry_at = time.time() + delay
+                logger.exception(f"Failed to load skin model (attempt {self.attempts}); retrying in {delay:.0f}s")
+            finally:
+                self._ready.set()
+            self._retry_now.wait(delay)
+            self._retry_now.clear()
+            delay = min(delay * 2, self.max_retry_backoff)
+
+    @property
+    def state(self):
+        if not self._ready.is_set():
+            return 'loading' if self._thread is not None else 'not_started'
+        return 'failed' if self.error else 'ready'
+
+    def wait_ready(self, timeout=None):
+        """Wait up to `timeout` seconds for loading; raises ModelNotReady if unusable."""
+        self.start()
+        if not self._ready.wait(timeout):
+            raise ModelNotReady("Image model is still loading, please retry shortly")
+        if self.error:
+            raise ModelNotReady(f"Image model failed to load: {self.error}")
+
+    def predict(self, image_array, wait=0.0):
+        """Class probabilities for one preprocessed 224x224x3 image."""
+        self.wait_ready(wait)
+        return np.asarray(self.batcher.predict(image_array))
+
+    def status(self):
+        return {
+            'state': self.state,
+            'model_path': self.model_path,
+            'backend': self.backend,
+            'load_seconds': self.load_seconds,
+            'attempts': self.attempts,
+            'error': self.error,
+            'next_retry_at': self.next_retry_at,
+        }
+
+    def stats(self):
+        return dict(self.status(), batcher=self.batcher.stats() if self.batcher else None)
@@ -0,0 +1,46 @@
+import json
+
+from flask import Response, stream_with_context
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream',
+}
+
+
+def requested_stream_format(data, req):
+    """Return 'ndjson' or 'sse' when the client opted into streaming, else None.
+
+    Clients opt in with a `stream` field in the JSON body ("ndjson", "sse" or
+    true for NDJSON) or by sending a matching Accept header.
+    """
+    fmt = (data or {}).get('stream')
+    if fmt is True:
+        return 'ndjson'
+    if isinstance(fmt, str) and fmt.lower() in STREAM_MIMETYPES:
+        return fmt.lower()
+    accept = req.headers.get('Accept', '')
+    if 'text/event-stream' in accept:
+        return 'sse'
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    return None
+
+
+def encode_record(record, fmt):
+    payload = json.dumps(record, separators=(',', ':'))
+    if fmt == 'sse':
+        return f"event: {record.get('type', 'message')}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+def stream_records(records, fmt):
+    """Stream an iterable of dict records as NDJSON lines or Server-Sent Events."""
+    def generate():
+        for record in records:
+            yield encode_record(record, fmt)
+
+    response = Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[fmt])
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
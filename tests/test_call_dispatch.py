@@ -0,0 +1,161 @@
+import socket
+import time
+
+import pytest
+
+import ambulance
+import deadline as request_deadline
+from benchmarks.stub_bland import start_stub_bland
+from call_dispatch import CallDispatcher, FINISHED
+
+
+@pytest.fixture
+def bland(monkeypatch):
+    server, url = start_stub_bland(latency=0.01)
+    monkeypatch.setattr(ambulance, "BLAND_API_URL", url)
+    yield server
+    server.shutdown()
+
+
+def make_dispatcher(**kwargs):
+    kwargs.setdefault("find_call", ambulance.find_bland_call)
+    return CallDispatcher(ambulance.dispatch_ambulance_call, backoff=0.01, **kwargs)
+
+
+def payload(number="9800000001"):
+    return {'name': "Stub", 'call_number': number, 'lat': None, 'lng': None, 'call_ref': f"ref-{time.time_ns()}"}
+
+
+def wait_finished(dispatcher, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = dispatcher.get(job_id)
+        if job['status'] in FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_double_click_places_one_call(bland):
+    dispatcher = make_dispatcher()
+    first, created = dispatcher.submit(payload(), "derived", ttl=5)
+    second, created_again = dispatcher.submit(payload(), "derived", ttl=5)
+    assert created and not created_again
+    assert second['job_id'] == first['job_id']
+    assert wait_finished(dispatcher, first['job_id'])['status'] == 'completed'
+    assert len(bland.calls) == 1
+
+
+def test_derived_key_redial_after_window_places_new_call(bland):
+    dispatcher = make_dispatcher()
+    first, _ = dispatcher.submit(payload(), "derived", ttl=0.05)
+    wait_finished(dispatcher, first['job_id'])
+    time.sleep(0.1)
+    second, created = dispatcher.submit(payload(), "derived", ttl=0.05)
+    assert created and second['job_id'] != first['job_id']
+    wait_finished(dispatcher, second['job_id'])
+    assert len(bland.calls) == 2
+
+
+def test_in_flight_job_is_deduplicated_past_its_window(bland):
+    bland.latency = 0.3
+    dispatcher = make_dispatcher()
+    first, _ = dispatcher.submit(payload(), "derived", ttl=0.01)
+    time.sleep(0.1)
+    second, created = dispatcher.submit(payload(), "derived", ttl=0.01)
+    assert not created and second['job_id'] == first['job_id']
+    wait_finished(dispatcher, first['job_id'])
+    assert len(bland.calls) == 1
+
+
+def test_client_key_deduplicates_completed_job(bland):
+    dispatcher = make_dispatcher(idempotency_ttl=300)
+    first, _ = dispatcher.submit(payload(), "client-key")
+    wait_finished(dispatcher, first['job_id'])
+    second, created = dispatcher.submit(payload(), "client-key")
+    assert not created and second['status'] == 'completed'
+    assert len(bland.calls) == 1
+
+
+def test_5xx_without_a_call_is_verified_then_retried(bland):
+    bland.fail_first = 2
+    dispatcher = make_dispatcher(max_attempts=3)
+    job, _ = dispatcher.submit(payload(), "key")
+    job = wait_finished(dispatcher, job['job_id'])
+    assert job['status'] == 'completed' and job['attempts'] == 3
+    assert bland.requests == 3 and bland.lookups == 2
+    assert len(bland.calls) == 1
+
+
+def test_placed_but_failed_call_is_found_not_replaced(bland):
+    bland.fail_after_placing = 1
+    dispatcher = make_dispatcher()
+    job, _ = dispatcher.submit(payload(), "key")
+    job = wait_finished(dispatcher, job['job_id'])
+    assert job['status'] == 'completed'
+    assert bland.requests == 1 and len(bland.calls) == 1
+    assert bland.lookups >= 1
+
+
+def test_unverifiable_outcome_is_unknown_and_not_retried(bland):
+    bland.fail_after_placing = 1
+
+    def lookup_down(payload, since):
+        raise RuntimeError("lookup unavailable")
+
+    dispatcher = make_dispatcher(find_call=lookup_down)
+    job, _ = dispatcher.submit(payload(), "key")
+    job = wait_finished(dispatcher, job['job_id'])
+    assert job['status'] == 'unknown'
+    assert bland.requests == 1
+
+
+def test_refused_connection_is_retried_then_fails(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setattr(ambulance, "BLAND_API_URL", f"http://127.0.0.1:{port}/v1")
+    dispatcher = make_dispatcher(max_attempts=2)
+    job, _ = dispatcher.submit(payload(), "key")
+    job = wait_finished(dispatcher, job['job_id'])
+    assert job['status'] == 'failed' and job['attempts'] == 2
+
+
+def test_call_ambulance_redial_is_not_swallowed_by_derived_key(bland, monkeypatch):
+    monkeypatch.setattr(ambulance, "CALL_DOUBLE_CLICK_WINDOW", 0.2)
+    client = ambulance.app.test_client()
+    body = {"name": "Stub", "phone_number": "9800000042", "confirm": True, "async": True}
+    first = client.post("/call-ambulance", json=body).get_json()
+    assert client.post("/call-ambulance", json=body).get_json()['job_id'] == first['job_id']
+    wait_finished(ambulance.call_dispatcher, first['job_id'])
+    time.sleep(0.3)
+    redial = client.post("/call-ambulance", json=body)
+    assert redial.status_code == 202 and redial.get_json()['job_id'] != first['job_id']
+    wait_finished(ambulance.call_dispatcher, redial.get_json()['job_id'])
+    assert len(bland.calls) == 2
+
+
+def sync_call(number):
+    client = ambulance.app.test_client()
+    return client.post("/call-ambulance", json={"name": "Stub", "phone_number": number, "confirm": True})
+
+
+def test_sync_call_placed_despite_5xx_is_reported_initiated(bland):
+    bland.fail_after_placing = 1
+    resp = sync_call("9800000051")
+    assert resp.status_code == 200 and resp.get_json()['message'] == 'Call initiated'
+    assert bland.requests == 1 and len(bland.calls) == 1
+
+
+def test_sync_call_with_unknown_outcome_is_not_reported_as_error(bland):
+    bland.fail_first = 1
+    resp = sync_call("9800000052")
+    assert resp.status_code == 202 and resp.get_json()['status'] == 'unknown'
+    assert bland.requests == 1
+
+
+def test_bland_post_ignores_request_budget(bland):
+    bland.latency = 0.3
+    with request_deadline.latency_budget(0.05):
+        response = ambulance.post_bland_call("9800000053", "task")
+    assert response.status_code == 200 and len(bland.calls) == 1
@@ -0,0 +1,57 @@
+import pytest
+
+from response_cache import ResponseCache, clinical_terms, normalize_prompt
+
+NEGATED_PAIRS = [
+    ("I am pregnant and have a headache, what can I take?",
+     "I am not pregnant and have a headache, what can I take?"),
+    ("I am allergic to penicillin and have a sore throat",
+     "I am not allergic to penicillin and have a sore throat"),
+    ("I have diabetes and a fever for 2 days",
+     "I have no diabetes and a fever for 2 days"),
+    ("I have a rash and I take ibuprofen",
+     "I have a rash and I don't take ibuprofen"),
+    ("no fever, but a cough and pregnant",
+     "fever, but a cough and not pregnant"),
+]
+
+DIFFERENT_TERMS = [
+    ("fever for 2 days, I am 45 years old", "fever for 3 days, I am 45 years old"),
+    ("fever for 2 days, I am 45 years old", "fever for 2 days, I am 4 years old"),
+    ("I take ibuprofen for back pain", "I take aspirin for back pain"),
+    ("I have asthma and a dry cough", "I have tuberculosis and a dry cough"),
+]
+
+SWAPPED_TERMS = [
+    ("fever for 2 days and cough for 5 days", "fever for 5 days and cough for 2 days"),
+    ("headache on the left side, no pain on the right side",
+     "headache on the right side, no pain on the left side"),
+    ("pain in my left arm but not in my chest", "pain in my chest but not in my left arm"),
+]
+
+
+@pytest.mark.parametrize("first, second", NEGATED_PAIRS + DIFFERENT_TERMS + SWAPPED_TERMS)
+def test_prompts_with_different_clinical_terms_miss(first, second):
+    for cached, asked in ((first, second), (second, first)):
+        cache = ResponseCache(threshold=0.0)
+        cache.set(cached, "diagnosis and prescription")
+        assert cache.get(asked) == (None, 'miss')
+
+
+def test_filler_and_punctuation_still_hit_near():
+    cache = ResponseCache()
+    cache.set("I have a fever and a headache for 2 days now", "rest and fluids")
+    assert cache.get("I have fever and a headache for 2 days now!") == ("rest and fluids", 'near')
+    assert cache.get("i have a fever and a headache, for 2 days now") == ("rest and fluids", 'exact')
+
+
+def test_exact_only():
+    cache = ResponseCache(near=False)
+    cache.set("I have a fever and a headache for 2 days now", "rest and fluids")
+    assert cache.get("Fever and headache for 2 days!") == (None, 'miss')
+    assert cache.get("I have a fever and a headache for 2 days now") == ("rest and fluids", 'exact')
+
+
+def test_negation_binds_to_next_term():
+    assert clinical_terms(normalize_prompt("I don't have diabetes")) == ("not:diabetes",)
+    assert clinical_terms(normalize_prompt("I do not have diabetes")) == ("not:diabetes",)